@@ -2,18 +2,23 @@ import sqlite3
 
 # local imports
 from .table import TableDef, ColumnDef, DataType
+from .maintenance import scheduler
+from .transactions import writer
 from .util import binary_decision
 
+# the definition of the airport table is shared by every handle to it
+AIRPORT_TABLE_DEF = TableDef("airport", [
+    ColumnDef("id", DataType.Int),
+    ColumnDef("icao_code", DataType.Text),
+    ColumnDef("name", DataType.Text),
+    ColumnDef("city", DataType.Text)
+])
+
 class AirportTable():
     table_def: TableDef
 
     def __init__(self):
-        self.table_def = TableDef("airport", [
-            ColumnDef("id", DataType.Int),
-            ColumnDef("icao_code", DataType.Text),
-            ColumnDef("name", DataType.Text),
-            ColumnDef("city", DataType.Text)
-        ])
+        self.table_def = AIRPORT_TABLE_DEF
     
     def create_record(self, conn: sqlite3.Connection):
         # get the values of all non-auto fields from user input
@@ -26,8 +31,8 @@ class AirportTable():
                 (?, ?, ?) 
         """
 
-        conn.execute(statement, [value.inner for value in values])
-        conn.commit()
+        writer.execute(conn, statement, [value.inner for value in values])
+        scheduler.record_writes(conn, self.table_def.name)
 
         print("new airport created successfully")
 
@@ -58,17 +63,14 @@ class AirportTable():
             print(f"    {key}: {value_str}")
         
         if binary_decision("would you like to proceed with these changes?"):
-            update_set = [f"{column.name} = ?" for column in updateable_columns]
             values = [record[column.name].inner for column in updateable_columns]
 
-            if len(update_set) > 0:
-                statement = f"""
-                    UPDATE {self.table_def.name} SET {", ".join(update_set)} WHERE id = ?
-                """
+            if len(updateable_columns) > 0:
+                statement = self.table_def.update_statement([column.name for column in updateable_columns])
 
                 values.append(record["id"].inner)
-                conn.execute(statement, values)
-                conn.commit()
+                writer.execute(conn, statement, values)
+                scheduler.record_writes(conn, self.table_def.name)
 
                 print("existing airport updated successfully")
 
@@ -0,0 +1,157 @@
+import sqlite3
+import time
+
+from typing import List, Optional
+
+# local imports
+from .util import select_int_in_range, clear_stdout, binary_decision
+from .airport import AirportTable
+from .pilot import PilotTable
+from .flight import FlightTable
+from .derived_queries import flight_pilot_assignments, pilot_destination_frequencies, pilot_schedule, unassigned_pilots
+
+ANALYTICS_TABLES = ["airport", "pilot", "flight", "flight_pilot"]
+
+# these indexes only exist on the in-memory copy. They serve the joins and sorts of the derived queries
+# and would otherwise slow down every write made to the database on disk
+ANALYTICS_INDEXES = {
+    "flight": [
+        "CREATE INDEX IF NOT EXISTS analytics_flight_origin_id ON flight (origin_id)",
+        "CREATE INDEX IF NOT EXISTS analytics_flight_destination_id ON flight (destination_id)",
+    ],
+    "flight_pilot": [
+        "CREATE INDEX IF NOT EXISTS analytics_flight_pilot_pilot_id ON flight_pilot (pilot_id)",
+    ],
+}
+
+# this is a read-only copy of the database, or a subset of its tables, that is held in memory so that
+# repeated reporting queries never touch the disk. The copy only changes when it is explicitly refreshed
+class AnalyticsSession:
+    tables: List[str]
+    conn: Optional[sqlite3.Connection]
+
+    def __init__(self, tables: Optional[List[str]] = None):
+        if tables is None:
+            tables = ANALYTICS_TABLES
+
+        self.tables = tables
+        self.conn = None
+
+    def load(self, source: sqlite3.Connection) -> float:
+        started = time.perf_counter()
+
+        memory = sqlite3.connect(":memory:")
+        memory.row_factory = sqlite3.Row
+
+        if set(self.tables) == set(ANALYTICS_TABLES):
+            # copying every page with the backup api is faster than copying the tables row by row
+            source.backup(memory)
+        else:
+            self.copy_tables(source, memory)
+
+        for table in self.tables:
+            for statement in ANALYTICS_INDEXES.get(table, []):
+                memory.execute(statement)
+
+        memory.execute("ANALYZE")
+        memory.commit()
+
+        # from here on the copy may only be read from
+        memory.execute("PRAGMA query_only = ON")
+
+        if self.conn is not None:
+            self.conn.close()
+        self.conn = memory
+
+        return time.perf_counter() - started
+
+    # copies the selected tables along with their own indexes by replaying their definitions from the source
+    # schema, after which the rows are copied over from the source database attached to the in-memory connection
+    def copy_tables(self, source: sqlite3.Connection, memory: sqlite3.Connection):
+        source_path = source.execute("PRAGMA database_list").fetchone()[2]
+        memory.execute("ATTACH DATABASE ? AS source", [source_path])
+
+        placeholders = ", ".join(["?" for _ in self.tables])
+        statement = f"""
+            SELECT sql FROM source.sqlite_master
+            WHERE type IN ('table', 'index') AND tbl_name IN ({placeholders}) AND sql IS NOT NULL
+            ORDER BY type = 'index'
+        """
+
+        for row in memory.execute(statement, self.tables).fetchall():
+            memory.execute(row[0])
+
+        for table in self.tables:
+            memory.execute(f"INSERT INTO main.{table} SELECT * FROM source.{table}")
+
+        memory.commit()
+        memory.execute("DETACH DATABASE source")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+def select_analytics_tables() -> List[str]:
+    clear_stdout()
+
+    if binary_decision("Would you like to load every table into memory?"):
+        return ANALYTICS_TABLES
+
+    tables: List[str] = []
+    for table in ANALYTICS_TABLES:
+        if binary_decision(f"Would you like to load the {table} table into memory?"):
+            tables.append(table)
+
+    return tables
+
+# this is a console of its own that runs listings and derived queries against an in-memory copy of the database
+def run_analytics_mode(conn: sqlite3.Connection):
+    session = AnalyticsSession(select_analytics_tables())
+
+    elapsed = session.load(conn)
+    print(f"loaded {', '.join(session.tables)} into memory in {elapsed:.3f}s")
+
+    airport_table = AirportTable()
+    pilot_table = PilotTable()
+    flight_table = FlightTable()
+
+    options = [
+        ("List Existing Airports", airport_table.list_records),
+        ("List Existing Pilots", pilot_table.list_records),
+        ("List Existing Flights", flight_table.list_records),
+        ("List Assigned Pilots for a Particular Flight", flight_pilot_assignments),
+        ("List Pilots not Assigned to any Flight", unassigned_pilots),
+        ("Show Pilot Schedule", pilot_schedule),
+        ("List Frequency of Pilot Destinations", pilot_destination_frequencies),
+        ("Refresh Analytics Copy from Disk", None),
+        ("Leave Analytics Mode", None),
+    ]
+
+    try:
+        while True:
+            print("Analytics mode: queries run against an in-memory copy of the database. Please select an option from the list below")
+
+            for idx, (name, _) in enumerate(options):
+                print(f"    ({idx + 1}). {name}")
+
+            # this should result in an idx within the correct bounds
+            selected_idx = select_int_in_range("Please enter an option number: ", 1, len(options)) - 1
+
+            name, endpoint = options[selected_idx]
+
+            if name == "Leave Analytics Mode":
+                return
+
+            if name == "Refresh Analytics Copy from Disk":
+                elapsed = session.load(conn)
+                print(f"analytics copy refreshed in {elapsed:.3f}s")
+                continue
+
+            try:
+                endpoint(session.conn)
+            except sqlite3.OperationalError as e:
+                # this happens when the query needs a table that was not loaded into memory
+                print(f"The query could not be run against the analytics copy: {e}")
+    finally:
+        session.close()
@@ -0,0 +1,190 @@
+import sqlite3
+
+from typing import List, Tuple
+
+# local imports
+from .table import TableDef, ColumnDef, DataType, Value
+from .flight import FlightTable
+from .maintenance import scheduler
+from .transactions import writer
+from .util import binary_decision
+
+ARCHIVE_PATH = "airline_archive.db"
+ARCHIVE_SCHEMA = "archive"
+
+# the number of flights that are moved into the archive per transaction. Keeping the batches small
+# means that other sessions are never locked out of the database for long while an archival is running
+ARCHIVE_BATCH_SIZE = 500
+
+# attaches the archive database to the connection, creating it if it does not exist yet, and creates temporary
+# views that union the hot and archived tables so that historical reports can query across both of them.
+# note that the archived tables carry no foreign keys since sqlite does not enforce them across databases
+def attach_archive(conn: sqlite3.Connection):
+    attached = [database[1] for database in conn.execute("PRAGMA database_list").fetchall()]
+    if ARCHIVE_SCHEMA in attached:
+        return
+
+    conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", [ARCHIVE_PATH])
+
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.flight (
+            id INTEGER PRIMARY KEY,
+            flight_number TEXT NOT NULL,
+            date DATE NOT NULL,
+            status TEXT NOT NULL,
+            departure_time DATETIME NOT NULL,
+            arrival_time DATETIME NOT NULL,
+            origin_id INTEGER NOT NULL,
+            destination_id INTEGER NOT NULL,
+            UNIQUE (flight_number, date)
+        )
+    """)
+
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.flight_pilot (
+            flight_id INTEGER NOT NULL,
+            pilot_id INTEGER NOT NULL,
+            PRIMARY KEY (flight_id, pilot_id)
+        )
+    """)
+
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.archived_flight_date ON flight (date)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.archived_flight_pilot_pilot_id ON flight_pilot (pilot_id)")
+
+    # views in the main database may not reference attached databases, so the union views are temporary
+    conn.execute(f"""
+        CREATE TEMP VIEW IF NOT EXISTS all_flight AS
+            SELECT * FROM main.flight
+            UNION ALL
+            SELECT * FROM {ARCHIVE_SCHEMA}.flight
+    """)
+
+    conn.execute(f"""
+        CREATE TEMP VIEW IF NOT EXISTS all_flight_pilot AS
+            SELECT * FROM main.flight_pilot
+            UNION ALL
+            SELECT * FROM {ARCHIVE_SCHEMA}.flight_pilot
+    """)
+
+    conn.commit()
+
+    # the archive may have been written while the flight dates were stored in another encoding, in which case it is
+    # brought in line with the main database. This is only known to be needed once a mismatched row has been found,
+    # so attaching the archive for reading does not take the write lock
+    FlightTable.refresh_temporal_encoding(conn)
+
+    statement = f"SELECT 1 FROM {ARCHIVE_SCHEMA}.flight WHERE typeof(date) != ? LIMIT 1"
+    if conn.execute(statement, [FlightTable.temporal_storage_type(FlightTable.temporal_encoding)]).fetchone() is None:
+        return
+
+    flight_table = FlightTable()
+
+    # the encoding is read again once the write lock is held, in case it was changed after the probe
+    def convert(conn: sqlite3.Connection) -> int:
+        return flight_table.convert_table_temporal_encoding(conn, f"{ARCHIVE_SCHEMA}.flight", FlightTable.temporal_encoding)
+
+    try:
+        writer.run(conn, convert)
+    except sqlite3.Error as e:
+        # the archive is only checked when it is attached, so it is detached again to be checked by the next attempt
+        conn.execute(f"DETACH DATABASE {ARCHIVE_SCHEMA}")
+        raise e
+
+# moves arrived flights that departed before the cutoff date, along with their pilot assignments, into the archive.
+# each batch is moved in its own transaction so that a flight and its assignments are always archived together
+def archive_flights_before(conn: sqlite3.Connection, cutoff: Value, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    attach_archive(conn)
+
+    archived = 0
+    while True:
+        flight_ids = archive_batch(conn, cutoff, batch_size)
+        if len(flight_ids) == 0:
+            return archived
+
+        archived += len(flight_ids)
+
+# moves up to batch_size flights before the cutoff date and returns their ids. The flights are selected inside the
+# transaction, where the cutoff is compared in the storage encoding the dates have while it is held
+def archive_batch(conn: sqlite3.Connection, cutoff: Value, batch_size: int) -> List[int]:
+    date_column = FlightTable().table_def.column_by_name("date")
+
+    statement = """
+        SELECT id FROM main.flight
+        WHERE status = 'arrived' AND date < ?
+        ORDER BY id
+        LIMIT ?
+    """
+
+    def move(conn: sqlite3.Connection) -> Tuple[List[int], int]:
+        flight_ids = [row[0] for row in conn.execute(statement, [date_column.to_storage(cutoff), batch_size]).fetchall()]
+        if len(flight_ids) == 0:
+            return flight_ids, 0
+
+        placeholders = ", ".join(["?" for _ in flight_ids])
+        conn.execute(f"INSERT INTO {ARCHIVE_SCHEMA}.flight SELECT * FROM main.flight WHERE id IN ({placeholders})", flight_ids)
+        conn.execute(f"INSERT INTO {ARCHIVE_SCHEMA}.flight_pilot SELECT * FROM main.flight_pilot WHERE flight_id IN ({placeholders})", flight_ids)
+        assignments = conn.execute(f"DELETE FROM main.flight_pilot WHERE flight_id IN ({placeholders})", flight_ids).rowcount
+        conn.execute(f"DELETE FROM main.flight WHERE id IN ({placeholders})", flight_ids)
+        return flight_ids, assignments
+
+    flight_ids, assignments = writer.run(conn, move)
+    if len(flight_ids) == 0:
+        return flight_ids
+
+    scheduler.record_writes(conn, "flight", len(flight_ids))
+    scheduler.record_writes(conn, "flight_pilot", assignments)
+    FlightTable.notify_written(conn, flight_ids)
+
+    return flight_ids
+
+def archive_completed_flights(conn: sqlite3.Connection):
+    flight_table = FlightTable()
+    date_column = flight_table.table_def.column_by_name("date")
+
+    cutoff = flight_table.table_def.get_value(date_column, "Please enter the cutoff date. Arrived flights before this date will be archived: ")
+
+    if binary_decision(f"Arrived flights before {cutoff.to_str()} will be moved to {ARCHIVE_PATH}. Would you like to proceed?"):
+        archived = archive_flights_before(conn, cutoff)
+        print(f"{archived} flights archived successfully")
+
+# this lists flights from both the hot and archived flight tables by pointing the flight column definitions at the union view
+def list_all_flights(conn: sqlite3.Connection):
+    attach_archive(conn)
+
+    table = TableDef("all_flight", FlightTable().table_def.columns)
+
+    records = table.find_records_with_conditions(conn.cursor())
+    table.display_records(records)
+
+# this is the same aggregation as pilot_destination_frequencies, except that it runs against the union views
+# so that the visits counted include the flights that have since been archived
+def historical_pilot_destination_frequencies(conn: sqlite3.Connection):
+    attach_archive(conn)
+
+    statement = """
+        SELECT
+            p.name AS pilot,
+            a.icao_code AS destination,
+            COUNT(*) AS visits
+        FROM
+            all_flight_pilot fp
+        JOIN
+            all_flight f ON fp.flight_id = f.id
+        JOIN
+            pilot p ON fp.pilot_id = p.id
+        JOIN
+            airport a ON f.destination_id = a.id
+        GROUP BY
+            p.id, a.id
+        ORDER BY
+            visits DESC
+    """
+
+    table = TableDef("historical_pilot_destination_frequencies", [
+        ColumnDef("pilot", DataType.Text),
+        ColumnDef("destination", DataType.Text),
+        ColumnDef("visits", DataType.Int),
+    ])
+
+    results = table.find_records(conn.cursor(), statement, [])
+    table.display_records(results)
@@ -0,0 +1,204 @@
+import os
+import sqlite3
+import threading
+import time
+
+from datetime import datetime
+from typing import List, Optional
+
+# local imports
+from .connection import open_connection, DATABASE_PATH
+
+BACKUP_DIRECTORY = "backups"
+BACKUP_PREFIX = "airline-"
+BACKUP_SUFFIX = ".db"
+
+# the number of pages copied per backup step and the time slept between steps. Each step only holds a read
+# lock for as long as it takes to copy these pages, so writers are never blocked for more than a few milliseconds
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.005
+
+# every write to the database from another connection restarts a backup from its first page, so under a steady
+# stream of writes a backup copied a few pages at a time would never finish. In WAL mode the backup falls back to
+# copying the whole database in a single step after this many restarts, since its read lock does not block writers
+MAX_BACKUP_RESTARTS = 3
+
+# without WAL a single step would block writers for the entire copy. Instead, the backup keeps copying a few pages at
+# a time and waits before starting over, twice as long after every restart up to the cap. It gives up after this many
+# restarts, so that it never holds on to the database for long while it is being written to
+MAX_BACKUP_RESTARTS_WITHOUT_WAL = 10
+BACKUP_RESTART_BACKOFF_CAP = 2.0
+
+# the number of most recent snapshots that are kept, older snapshots are deleted after every backup
+BACKUP_RETENTION = 7
+
+# the environment variable that, when set to a number of seconds, enables the periodic background backups
+BACKUP_INTERVAL_ENV = "AIRLINE_BACKUP_INTERVAL"
+
+class BackupResult:
+    path: str
+    steps: int
+    # the number of times the backup started over because another connection wrote to the database
+    restarts: int
+    page_count: int
+    elapsed: float
+
+    def __init__(self, path: str, steps: int, restarts: int, page_count: int, elapsed: float):
+        self.path = path
+        self.steps = steps
+        self.restarts = restarts
+        self.page_count = page_count
+        self.elapsed = elapsed
+
+# raised from the progress callback of a backup to abort it once it was restarted too often. This is a database error
+# so that it is reported like any other failed backup
+class BackupRestartLimitReached(sqlite3.DatabaseError):
+    pass
+
+# this copies the database into a timestamped snapshot using the online backup api, a bounded number of pages at a time.
+# The snapshot is written to a temporary file first so that a partially written backup is never mistaken for a complete one
+def create_backup(
+    conn: sqlite3.Connection,
+    directory: str = BACKUP_DIRECTORY,
+    pages: int = BACKUP_PAGES_PER_STEP,
+    sleep: float = BACKUP_STEP_SLEEP,
+    retention: int = BACKUP_RETENTION
+) -> BackupResult:
+    os.makedirs(directory, exist_ok=True)
+
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    path = os.path.join(directory, f"{BACKUP_PREFIX}{timestamp}{BACKUP_SUFFIX}")
+    partial_path = f"{path}.partial"
+
+    steps = 0
+    restarts = 0
+    page_count = 0
+    last_remaining: Optional[int] = None
+
+    wal = conn.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+    max_restarts = MAX_BACKUP_RESTARTS if wal else MAX_BACKUP_RESTARTS_WITHOUT_WAL
+
+    # sqlite only sleeps between steps when a step found the database locked, so the pause that lets writers in
+    # between steps is taken here, after every step
+    def progress(status: int, remaining: int, total: int):
+        nonlocal steps, restarts, page_count, last_remaining
+        steps += 1
+        page_count = total
+
+        # the number of remaining pages only grows when the backup was restarted from the first page
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise BackupRestartLimitReached(f"the backup was restarted {max_restarts} times by writes to the database")
+
+            if not wal:
+                time.sleep(min(BACKUP_RESTART_BACKOFF_CAP, sleep * 2 ** restarts))
+        last_remaining = remaining
+
+        if remaining > 0:
+            time.sleep(sleep)
+
+    def copy(pages: int):
+        target = sqlite3.connect(partial_path)
+        try:
+            conn.backup(target, pages=pages, progress=progress, sleep=sleep)
+        finally:
+            target.close()
+
+    started = time.perf_counter()
+
+    try:
+        try:
+            copy(pages)
+        except BackupRestartLimitReached as e:
+            if not wal:
+                raise e
+
+            copy(-1)
+
+        os.replace(partial_path, path)
+    except BaseException as e:
+        # a failed backup leaves no partial snapshot behind
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise e
+
+    elapsed = time.perf_counter() - started
+
+    prune_backups(directory, retention)
+
+    return BackupResult(path, steps, restarts, page_count, elapsed)
+
+def list_backups(directory: str = BACKUP_DIRECTORY) -> List[str]:
+    if not os.path.isdir(directory):
+        return []
+
+    # the timestamp in the file name sorts chronologically, so the oldest backups come first
+    names = sorted([name for name in os.listdir(directory) if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIX)])
+    return [os.path.join(directory, name) for name in names]
+
+def prune_backups(directory: str = BACKUP_DIRECTORY, retention: int = BACKUP_RETENTION):
+    backups = list_backups(directory)
+
+    for path in backups[:max(len(backups) - retention, 0)]:
+        os.remove(path)
+
+def backup_database(conn: sqlite3.Connection):
+    print("Creating an online backup of the database. You may keep using the database while this runs")
+
+    try:
+        result = create_backup(conn)
+    except BackupRestartLimitReached as e:
+        print(f"The backup did not complete since {e}. Please try again once there are fewer writes")
+        return
+
+    print(f"backup written to {result.path} ({result.page_count} pages in {result.steps} steps with {result.restarts} restarts, {result.elapsed:.3f}s)")
+
+# this runs backups periodically on a background thread. The thread uses a connection of its own
+# since sqlite connections may not be shared across threads
+class BackupScheduler(threading.Thread):
+    interval: float
+    database_path: str
+    stop_event: threading.Event
+    last_result: Optional[BackupResult]
+    last_error: Optional[Exception]
+
+    def __init__(self, interval: float, database_path: str = DATABASE_PATH):
+        super().__init__(name="backup-scheduler", daemon=True)
+        self.interval = interval
+        self.database_path = database_path
+        self.stop_event = threading.Event()
+        self.last_result = None
+        self.last_error = None
+
+    def run(self):
+        # wait for the first interval to elapse before backing up, and stop as soon as we are asked to
+        while not self.stop_event.wait(self.interval):
+            conn = open_connection(self.database_path)
+            try:
+                self.last_result = create_backup(conn)
+            except sqlite3.Error as e:
+                # a failed backup should not bring down the session, the next interval will try again
+                self.last_error = e
+            finally:
+                conn.close()
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+# starts the background backups if they were enabled through the environment
+def start_backup_scheduler() -> Optional[BackupScheduler]:
+    maybe_interval = os.environ.get(BACKUP_INTERVAL_ENV)
+    if maybe_interval is None:
+        return None
+
+    try:
+        interval = float(maybe_interval)
+    except ValueError:
+        print(f"Ignoring {BACKUP_INTERVAL_ENV}, expected a number of seconds but got: {maybe_interval}")
+        return None
+
+    backup_scheduler = BackupScheduler(interval)
+    backup_scheduler.start()
+    return backup_scheduler
@@ -0,0 +1,135 @@
+import sqlite3
+import sys
+
+from typing import List, TextIO
+
+# local imports
+from .table import TableDef
+from .airport import AirportTable
+from .pilot import PilotTable
+from .flight import FlightTable
+from .flight_pilot import FlightPilotTable
+from .util import select_int_in_range, clear_stdout
+
+# the number of changes fetched from the change log at a time while exporting
+EXPORT_BATCH_SIZE = 1000
+
+# the primary key columns of every table whose changes are captured
+PRIMARY_KEYS = {
+    "airport": ["id"],
+    "pilot": ["id"],
+    "flight": ["id"],
+    "flight_pilot": ["flight_id", "pilot_id"],
+}
+
+def captured_tables() -> List[TableDef]:
+    return [
+        AirportTable().table_def,
+        PilotTable().table_def,
+        FlightTable().table_def,
+        FlightPilotTable().table_def,
+    ]
+
+# the change log is populated by triggers, which means that every write is captured no matter which code path made it.
+# seq is an AUTOINCREMENT key so it is never reused, which makes it safe to use as a watermark by downstream systems.
+# note that rows moved into the archive leave the hot tables and are therefore captured as deletes
+def create_change_log(conn: sqlite3.Connection):
+    statement = """
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            op TEXT NOT NULL,
+            pk TEXT NOT NULL,
+            new_values TEXT,
+            changed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """
+
+    conn.execute(statement)
+
+    for table_def in captured_tables():
+        for statement in change_log_triggers(table_def):
+            conn.execute(statement)
+
+    conn.commit()
+
+# generates the insert, update and delete triggers of a table from its column definitions.
+# the values are captured as stored on the database, so dates may be formatted strings or epoch integers
+def change_log_triggers(table_def: TableDef) -> List[str]:
+    def json_object(row: str, columns: List[str]) -> str:
+        pairs = ", ".join([f"'{column}', {row}.{column}" for column in columns])
+        return f"json_object({pairs})"
+
+    columns = [column.name for column in table_def.columns]
+    primary_key = PRIMARY_KEYS[table_def.name]
+
+    triggers: List[str] = []
+    for op, event, row, new_values in [
+        ("insert", "INSERT", "NEW", json_object("NEW", columns)),
+        ("update", "UPDATE", "NEW", json_object("NEW", columns)),
+        ("delete", "DELETE", "OLD", "NULL"),
+    ]:
+        triggers.append(f"""
+            CREATE TRIGGER IF NOT EXISTS change_log_{table_def.name}_{op}
+            AFTER {event} ON {table_def.name}
+            BEGIN
+                INSERT INTO change_log (table_name, op, pk, new_values)
+                VALUES ('{table_def.name}', '{op}', {json_object(row, primary_key)}, {new_values});
+            END
+        """)
+
+    return triggers
+
+def current_watermark(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT MAX(seq) FROM change_log").fetchone()
+    if row[0] is None:
+        return 0
+    return row[0]
+
+# streams every change made after the given watermark as one json object per line, in the order the changes were made.
+# the json is built by sqlite itself so the rows never have to be decoded in python. Returns the new watermark
+def export_changes(conn: sqlite3.Connection, since: int, out: TextIO, batch_size: int = EXPORT_BATCH_SIZE) -> int:
+    statement = """
+        SELECT
+            seq,
+            json_object(
+                'seq', seq,
+                'table', table_name,
+                'op', op,
+                'pk', json(pk),
+                'values', json(new_values),
+                'changed_at', changed_at
+            ) AS change
+        FROM change_log
+        WHERE seq > ?
+        ORDER BY seq
+    """
+
+    watermark = since
+    cursor = conn.execute(statement, [since])
+
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if len(rows) == 0:
+            return watermark
+
+        out.write("\n".join([row[1] for row in rows]))
+        out.write("\n")
+        watermark = rows[-1][0]
+
+def export_changes_since_watermark(conn: sqlite3.Connection):
+    clear_stdout()
+
+    latest = current_watermark(conn)
+    print(f"The latest change has the sequence number {latest}")
+
+    since = select_int_in_range("Please enter the watermark to export changes after: ", 0, latest)
+    path = input("Please enter a file to export the changes to (leave empty to print them): ")
+
+    if path == "":
+        watermark = export_changes(conn, since, sys.stdout)
+    else:
+        with open(path, "w") as out:
+            watermark = export_changes(conn, since, out)
+
+    print(f"changes up to {watermark} exported successfully. Use {watermark} as the watermark of the next export")
@@ -0,0 +1,42 @@
+import os
+import sqlite3
+
+from urllib.request import pathname2url
+
+# local imports
+from .statements import STATEMENT_CACHE_SIZE
+
+DATABASE_PATH = "airline.db"
+
+# how long a statement waits for another connection to release its lock before failing with "database is locked"
+BUSY_TIMEOUT_MS = 5000
+
+# opens a connection that is configured the same way as the one used by the console, so that connections
+# opened elsewhere (such as from a background thread) behave identically
+def open_connection(path: str = DATABASE_PATH) -> sqlite3.Connection:
+    # the prepared statement cache is sized to hold every statement of the registry
+    conn = sqlite3.connect(path, cached_statements=STATEMENT_CACHE_SIZE)
+    # use sqlite3.Row as row_factory to be able to access columns by name
+    conn.row_factory = sqlite3.Row
+    # enable foreign key support explicitly so that we can enforce foreign key constraints
+    conn.execute("PRAGMA foreign_keys = ON")
+    # wait for other writers rather than failing as soon as the database is locked
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+
+    return conn
+
+# opens a connection that can only read from the database, such as for the workers of the parallel reports.
+# any attempt to write through it fails, no matter which statement is executed
+def open_read_only_connection(path: str = DATABASE_PATH) -> sqlite3.Connection:
+    conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True, cached_statements=STATEMENT_CACHE_SIZE)
+    conn.row_factory = sqlite3.Row
+
+    return conn
+
+# the file of the main database of the connection, so that other connections can be opened to the same database
+def database_path(conn: sqlite3.Connection) -> str:
+    for row in conn.execute("PRAGMA database_list").fetchall():
+        if row[1] == "main":
+            return row[2]
+
+    raise ValueError("the connection has no main database")
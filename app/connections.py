@@ -0,0 +1,255 @@
+import bisect
+import sqlite3
+
+from typing import Dict, List, Optional, Tuple
+
+# local imports
+from .table import TableDef, ColumnDef, DataType, Value, UNIX_EPOCH
+from .flight import FlightTable
+from .airport import AirportTable
+from .change_log import current_watermark
+from .statements import registry, in_list_chunks, in_list_placeholders
+from .util import select_int_in_range
+
+# a leg is a single flight as (departure, arrival, destination_id, flight_id), with the times in epoch seconds
+Leg = Tuple[int, int, int, int]
+
+DEFAULT_MIN_CONNECTION_MINUTES = 45
+DEFAULT_MAX_HOPS = 3
+
+# when more flights than this were changed since the index was last brought up to date, it is built again from scratch
+# rather than rereading the changed flights one chunk at a time
+CATCH_UP_REBUILD_THRESHOLD = 10000
+
+# this is a time-expanded index of the flight network. The flights leaving each airport are kept sorted by departure,
+# so that the flights that can be caught from an airport after a given time are found with a binary search.
+# Flights may be written by other sessions, the http service or the status ingestion, so before every search the index
+# applies the changes to the flight table that were captured in the change log after its watermark
+class ConnectionIndex:
+    departures: Dict[int, List[Leg]]
+    departure_times: Dict[int, List[int]]
+    origins: Dict[int, int]
+    built: bool
+    # the sequence number of the last change in the change log that is reflected in the index
+    watermark: int
+
+    def __init__(self):
+        self.departures = {}
+        self.departure_times = {}
+        self.origins = {}
+        self.built = False
+        self.watermark = 0
+
+    def build(self, conn: sqlite3.Connection):
+        self.departures = {}
+        self.departure_times = {}
+        self.origins = {}
+
+        # the watermark is read first, so that changes made while the flights are read are applied again by the next
+        # catch up rather than missed. Applying a change twice rereads the same flight
+        self.watermark = current_watermark(conn)
+
+        for row in conn.execute(flight_times_statement()).fetchall():
+            self.upsert(row[0], row[1], row[2], row[3], row[4])
+
+        self.built = True
+
+    # brings the index up to date with the changes to the flight table captured in the change log after its watermark
+    def catch_up(self, conn: sqlite3.Connection):
+        if not self.built:
+            self.build(conn)
+            return
+
+        statement = """
+            SELECT json_extract(pk, '$.id')
+            FROM change_log
+            WHERE seq > ? AND table_name = 'flight'
+            ORDER BY seq
+        """
+
+        watermark = current_watermark(conn)
+        flight_ids = list(dict.fromkeys([row[0] for row in conn.execute(statement, [self.watermark]).fetchall()]))
+
+        if len(flight_ids) > CATCH_UP_REBUILD_THRESHOLD:
+            self.build(conn)
+            return
+
+        self.on_flights_written(conn, flight_ids)
+        self.watermark = watermark
+
+    def upsert(self, flight_id: int, origin_id: int, destination_id: int, departure: int, arrival: int):
+        self.remove(flight_id)
+
+        legs = self.departures.setdefault(origin_id, [])
+        times = self.departure_times.setdefault(origin_id, [])
+
+        leg = (departure, arrival, destination_id, flight_id)
+        idx = bisect.bisect_right(legs, leg)
+        legs.insert(idx, leg)
+        times.insert(idx, departure)
+        self.origins[flight_id] = origin_id
+
+    def remove(self, flight_id: int):
+        origin_id = self.origins.pop(flight_id, None)
+        if origin_id is None:
+            return
+
+        legs = self.departures[origin_id]
+        for idx, leg in enumerate(legs):
+            if leg[3] == flight_id:
+                del legs[idx]
+                del self.departure_times[origin_id][idx]
+                return
+
+    # rereads the flights that were written and updates their legs, flights that no longer exist are removed
+    def on_flights_written(self, conn: sqlite3.Connection, flight_ids: List[int]):
+        for chunk in in_list_chunks(flight_ids):
+            def build() -> str:
+                return f"{flight_times_statement()} WHERE id IN ({in_list_placeholders(len(chunk))})"
+
+            statement = registry.get(("flight", "epoch_times_by_id_with_airports", len(chunk)), build)
+
+            found = set()
+            for row in conn.execute(statement, chunk).fetchall():
+                self.upsert(row[0], row[1], row[2], row[3], row[4])
+                found.add(row[0])
+
+            for flight_id in chunk:
+                if flight_id not in found:
+                    self.remove(flight_id)
+
+    # finds the itinerary that arrives at the destination the earliest, departing the origin no earlier than the given time.
+    # The search runs in rounds, where round k finds the airports whose earliest arrival improves by taking k flights. Only
+    # the airports that improved in the previous round need to be expanded, and at least min_connection seconds must pass
+    # between arriving at an airport and departing it again
+    def earliest_arrival(self, origin_id: int, destination_id: int, depart_after: int, min_connection: int, max_hops: int) -> Optional[List[Leg]]:
+        # the earliest known arrival at every airport over all rounds so far
+        earliest: Dict[int, int] = {origin_id: depart_after}
+
+        # for every round, the airports that improved along with their arrival, the leg used and the airport it was taken from
+        rounds: List[Dict[int, Tuple[int, Leg, int]]] = []
+        previous_round: Dict[int, int] = {origin_id: depart_after}
+
+        for _ in range(max_hops):
+            current_round: Dict[int, Tuple[int, Leg, int]] = {}
+
+            for airport_id, arrived in previous_round.items():
+                ready = arrived
+                if airport_id != origin_id:
+                    ready += min_connection
+
+                legs = self.departures.get(airport_id, [])
+                idx = bisect.bisect_left(self.departure_times.get(airport_id, []), ready)
+
+                for leg in legs[idx:]:
+                    departure, arrival, next_airport, _ = leg
+
+                    # no flight departing this late can improve on the best arrival at the destination
+                    if destination_id in earliest and departure >= earliest[destination_id]:
+                        break
+
+                    if next_airport == origin_id or (next_airport in earliest and earliest[next_airport] <= arrival):
+                        continue
+
+                    earliest[next_airport] = arrival
+                    current_round[next_airport] = (arrival, leg, airport_id)
+
+            if len(current_round) == 0:
+                break
+
+            rounds.append(current_round)
+            previous_round = {airport_id: label[0] for airport_id, label in current_round.items()}
+
+        # the last round in which the destination improved holds its earliest arrival
+        reached_in = [idx for idx, current_round in enumerate(rounds) if destination_id in current_round]
+        if len(reached_in) == 0:
+            return None
+
+        itinerary: List[Leg] = []
+        airport_id = destination_id
+        idx = reached_in[-1]
+        while airport_id != origin_id:
+            _, leg, previous = rounds[idx][airport_id]
+            itinerary.append(leg)
+            airport_id = previous
+            idx -= 1
+
+        itinerary.reverse()
+        return itinerary
+
+    def search_connections(self, conn: sqlite3.Connection):
+        airport_table = AirportTable()
+        departure_column = FlightTable().table_def.column_by_name("departure_time")
+
+        print("Please select the airport to depart from")
+        maybe_origin = airport_table.table_def.select_record(conn.cursor())
+        if maybe_origin is None:
+            return
+
+        print("Please select the airport to arrive at")
+        maybe_destination = airport_table.table_def.select_record(conn.cursor())
+        if maybe_destination is None:
+            return
+
+        depart_after = airport_table.table_def.get_value(departure_column, "Please enter the earliest time to depart at: ")
+        min_connection = select_int_in_range(f"Please enter the minimum connection time in minutes (e.g. {DEFAULT_MIN_CONNECTION_MINUTES}): ", 0, 24 * 60)
+        max_hops = select_int_in_range(f"Please enter the maximum number of flights to take (e.g. {DEFAULT_MAX_HOPS}): ", 1, 10)
+
+        # the flights may have changed while the search was being entered
+        self.catch_up(conn)
+
+        itinerary = self.earliest_arrival(
+            maybe_origin["id"].inner,
+            maybe_destination["id"].inner,
+            int((depart_after.inner - UNIX_EPOCH).total_seconds()),
+            min_connection * 60,
+            max_hops,
+        )
+
+        if itinerary is None:
+            print("No connection could be found within the given number of flights")
+            return
+
+        flight_ids = [leg[3] for leg in itinerary]
+        placeholders = ", ".join(["?" for _ in flight_ids])
+        statement = f"""
+            SELECT
+                f.id,
+                f.flight_number,
+                f.departure_time,
+                f.arrival_time,
+                origin.icao_code AS origin,
+                destination.icao_code AS destination
+            FROM flight f
+            JOIN airport origin ON f.origin_id = origin.id
+            JOIN airport destination ON f.destination_id = destination.id
+            WHERE f.id IN ({placeholders})
+        """
+
+        table = TableDef("connection", [
+            ColumnDef("flight_number", DataType.Text),
+            ColumnDef("departure_time", DataType.DateTime),
+            ColumnDef("arrival_time", DataType.DateTime),
+            ColumnDef("origin", DataType.Text),
+            ColumnDef("destination", DataType.Text),
+        ])
+
+        rows = {row["id"]: row for row in conn.execute(statement, flight_ids).fetchall()}
+        results: List[dict[str, Value]] = [table.parse_row(rows[flight_id]) for flight_id in flight_ids if flight_id in rows]
+
+        table.display_records(results)
+
+def flight_times_statement() -> str:
+    flight_table = FlightTable()
+    departure_column = flight_table.table_def.column_by_name("departure_time")
+    arrival_column = flight_table.table_def.column_by_name("arrival_time")
+
+    return f"""
+        SELECT
+            id,
+            origin_id,
+            destination_id,
+            {departure_column.to_epoch_seconds_sql("departure_time")} AS departure_epoch,
+            {arrival_column.to_epoch_seconds_sql("arrival_time")} AS arrival_epoch
+        FROM flight
+    """
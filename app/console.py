@@ -2,8 +2,26 @@ from datetime import datetime
 
 import sqlite3
 
+from typing import Callable, Optional
+
 # local imports
 from .util import select_int_in_range, do_more, clear_stdout
+from .connection import open_connection
+from .maintenance import scheduler
+from .transactions import writer, is_lock_error
+from .profiling import OperationProfiler, profiling_requested
+from .statements import registry
+from .backup import backup_database, start_backup_scheduler
+from .analytics import run_analytics_mode
+from .change_log import create_change_log, export_changes_since_watermark
+from .status_ingest import ingest_status_events_from_file
+from .schedule_conflicts import schedule_conflict_report
+from .roster import pilot_roster
+from .duty_time import pilot_duty_times
+from .connections import ConnectionIndex
+from .dashboard import create_daily_aggregates, airport_operations_dashboard
+from .parallel_reports import create_report_indexes, parallel_pilot_destination_frequencies, parallel_export_flights
+from .archive import archive_completed_flights, list_all_flights, historical_pilot_destination_frequencies
 from .airport import AirportTable
 from .pilot import PilotTable
 from .flight import FlightTable
@@ -15,8 +33,11 @@ class Console:
     pilot_table: PilotTable
     flight_table: FlightTable
     flight_pilot_table: FlightPilotTable
+    connection_index: ConnectionIndex
+    # when set, every operation is run under the profiler
+    profiler: Optional[OperationProfiler]
 
-    def __init__(self):
+    def __init__(self, profile: bool = False):
         # Register the datetime adapter and converter to suppress the deprecation warning
         sqlite3.register_adapter(datetime, adapt_datetime)
         sqlite3.register_converter("DATETIME", convert_datetime)
@@ -25,27 +46,49 @@ class Console:
         self.pilot_table = PilotTable()
         self.flight_table = FlightTable()
         self.flight_pilot_table = FlightPilotTable()
+        self.connection_index = ConnectionIndex()
+        self.profiler = OperationProfiler() if profile or profiling_requested() else None
 
     def run(self):
-        with sqlite3.connect("airline.db") as conn:
-            # use sqlite3.Row as row_factory to be able to access columns by name
-            conn.row_factory = sqlite3.Row
-            # enable foreign key support explicitly so that we can enforce foreign key constraints
-            conn.execute("PRAGMA foreign_keys = ON")
-            
+        with open_connection() as conn:
             self.migrate(conn)
+
+            backup_scheduler = start_backup_scheduler()
             
-            while True:
-                try:
-                    self.select_option(conn)
-                except sqlite3.IntegrityError:
-                    print("An invalid update was prevented from violating a primary key or unique key constraint")
-                except Exception as e:
-                    print("An unrecoverable error occurred. this is most likely due to a bug in the code. My sincere apologies :(")
-                    raise e
-                
-                if do_more() is False:
-                    return
+            try:
+                while True:
+                    try:
+                        self.select_option(conn)
+                    except sqlite3.IntegrityError:
+                        print("An invalid update was prevented from violating a primary key or unique key constraint")
+                    except sqlite3.OperationalError as e:
+                        if not is_lock_error(e):
+                            print("An unrecoverable error occurred. this is most likely due to a bug in the code. My sincere apologies :(")
+                            raise e
+
+                        print("The database is being written to by someone else and stayed locked, your changes were not saved. Please try again")
+                    except Exception as e:
+                        print("An unrecoverable error occurred. this is most likely due to a bug in the code. My sincere apologies :(")
+                        raise e
+                    
+                    if do_more() is False:
+                        return
+            finally:
+                if backup_scheduler is not None:
+                    backup_scheduler.stop()
+
+                # refresh the planner statistics that have gone stale during this session before closing the connection
+                scheduler.optimize(conn)
+
+    # runs a single non-interactive command against the database, such as when data is piped into the program
+    def run_command(self, command: Callable[[sqlite3.Connection], None]):
+        with open_connection() as conn:
+            self.migrate(conn)
+
+            try:
+                self.run_endpoint(command.__name__, command, conn)
+            finally:
+                scheduler.optimize(conn)
 
     def select_option(self, conn: sqlite3.Connection):
         clear_stdout()
@@ -60,12 +103,31 @@ class Console:
             ("Add New Flight", self.flight_table.create_record),
             ("Update Existing Flight", self.flight_table.update_record),
             ("List Existing Flights", self.flight_table.list_records),
+            ("Ingest Flight Status Events from File", ingest_status_events_from_file),
             ("Assign Pilot to Flight", self.flight_pilot_table.assign_pilot_to_flight),
             ("Unassign Pilot from Flight", self.flight_pilot_table.unassign_pilot_from_flight),
+            ("Import Pilot Assignments from File", self.flight_pilot_table.import_assignments),
             ("List Assigned Pilots for a Particular Flight", flight_pilot_assignments),
             ("List Pilots not Assigned to any Flight", unassigned_pilots),
             ("Show Pilot Schedule", pilot_schedule),
+            ("Show Upcoming Roster for All Pilots", pilot_roster),
+            ("Show Pilot Duty Times and Rest Periods", pilot_duty_times),
             ("List Frequency of Pilot Destinations", pilot_destination_frequencies),
+            ("List Overlapping Pilot Assignments", schedule_conflict_report),
+            ("Search Flight Connections Between Airports", self.connection_index.search_connections),
+            ("Show Airport Operations Dashboard", airport_operations_dashboard),
+            ("Enter Analytics Mode (In-Memory, Read-Only)", run_analytics_mode),
+            ("Archive Completed Flights", archive_completed_flights),
+            ("List Flights Including Archive", list_all_flights),
+            ("List Frequency of Pilot Destinations Including Archive", historical_pilot_destination_frequencies),
+            ("List Frequency of Pilot Destinations in Parallel", parallel_pilot_destination_frequencies),
+            ("Export All Flights to CSV in Parallel", parallel_export_flights),
+            ("Create Online Backup", backup_database),
+            ("Export Changes Since Watermark", export_changes_since_watermark),
+            ("Change Flight Date Storage Encoding", self.flight_table.migrate_temporal_encoding),
+            ("Run Database Maintenance (VACUUM/ANALYZE)", scheduler.run_maintenance),
+            ("Show Write Contention Statistics", writer.show_stats),
+            ("Show Statement Cache Statistics", registry.show_stats),
         ]
 
         print("Please select an option from the list below")
@@ -76,15 +138,27 @@ class Console:
         # this should result in an idx within the correct bounds
         selected_idx = select_int_in_range("Please enter an option number: ", 1, len(options)) - 1
         
-        _, endpoint = options[selected_idx]
+        name, endpoint = options[selected_idx]
+
+        self.run_endpoint(name, endpoint, conn)
+
+    def run_endpoint(self, name: str, endpoint: Callable[[sqlite3.Connection], None], conn: sqlite3.Connection):
+        # the flight dates may have been converted to another storage encoding by another process since the last operation
+        FlightTable.refresh_temporal_encoding(conn)
 
-        endpoint(conn)
+        if self.profiler is None:
+            endpoint(conn)
+        else:
+            self.profiler.profile(name, endpoint, conn)
 
     def migrate(self, conn: sqlite3.Connection):
         self.airport_table.create_table(conn)
         self.pilot_table.create_table(conn)
         self.flight_table.create_table(conn)
         self.flight_pilot_table.create_table(conn)
+        create_change_log(conn)
+        create_daily_aggregates(conn)
+        create_report_indexes(conn)
             
             
 
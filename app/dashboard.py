@@ -0,0 +1,151 @@
+import sqlite3
+
+from typing import List
+
+# local imports
+from .table import TableDef, ColumnDef, DataType
+from .flight import FlightTable
+
+# the per-airport, per-day and per-status flight counts read by the dashboard. This table is kept current by triggers
+# on the flight table, so every path that writes flights (the console, status ingestion and imports) updates it in the
+# same transaction. Flights are only ever deleted when they are archived, so there is no delete trigger and archived
+# flights keep counting towards the days they flew on
+def create_daily_aggregates(conn: sqlite3.Connection):
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'airport_daily_flights'").fetchone() is not None
+
+    statement = """
+        CREATE TABLE IF NOT EXISTS airport_daily_flights (
+            airport_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            status TEXT NOT NULL,
+            departures INTEGER NOT NULL DEFAULT 0,
+            arrivals INTEGER NOT NULL DEFAULT 0,
+            block_seconds INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (airport_id, date, status)
+        ) WITHOUT ROWID
+    """
+
+    conn.execute(statement)
+
+    for statement in daily_aggregate_triggers():
+        conn.execute(statement)
+
+    # flights created before the aggregates existed are counted once, from then on the triggers take over
+    if not exists:
+        rebuild_daily_aggregates(conn)
+
+    conn.commit()
+
+# generates the sql expressions that derive the day, as YYYY-MM-DD, and the scheduled block time of a flight row.
+# These work on rows stored in either encoding, so converting the encoding leaves the aggregates unchanged
+def day_and_block_sql(row: str) -> List[str]:
+    flight_table = FlightTable()
+    date_column = flight_table.table_def.column_by_name("date")
+    departure_column = flight_table.table_def.column_by_name("departure_time")
+    arrival_column = flight_table.table_def.column_by_name("arrival_time")
+
+    day = f"date({date_column.to_epoch_seconds_sql(f'{row}.date')}, 'unixepoch')"
+    block = f"({arrival_column.to_epoch_seconds_sql(f'{row}.arrival_time')} - {departure_column.to_epoch_seconds_sql(f'{row}.departure_time')})"
+
+    return [day, block]
+
+def daily_aggregate_triggers() -> List[str]:
+    new_day, new_block = day_and_block_sql("NEW")
+    old_day, old_block = day_and_block_sql("OLD")
+
+    add_new = f"""
+        INSERT INTO airport_daily_flights (airport_id, date, status, departures, block_seconds)
+        VALUES (NEW.origin_id, {new_day}, NEW.status, 1, {new_block})
+        ON CONFLICT (airport_id, date, status) DO UPDATE SET
+            departures = departures + 1,
+            block_seconds = block_seconds + excluded.block_seconds;
+
+        INSERT INTO airport_daily_flights (airport_id, date, status, arrivals)
+        VALUES (NEW.destination_id, {new_day}, NEW.status, 1)
+        ON CONFLICT (airport_id, date, status) DO UPDATE SET
+            arrivals = arrivals + 1;
+    """
+
+    remove_old = f"""
+        UPDATE airport_daily_flights SET
+            departures = departures - 1,
+            block_seconds = block_seconds - {old_block}
+        WHERE airport_id = OLD.origin_id AND date = {old_day} AND status = OLD.status;
+
+        UPDATE airport_daily_flights SET
+            arrivals = arrivals - 1
+        WHERE airport_id = OLD.destination_id AND date = {old_day} AND status = OLD.status;
+    """
+
+    return [
+        f"""
+            CREATE TRIGGER IF NOT EXISTS airport_daily_flights_insert
+            AFTER INSERT ON flight
+            BEGIN
+                {add_new}
+            END
+        """,
+        f"""
+            CREATE TRIGGER IF NOT EXISTS airport_daily_flights_update
+            AFTER UPDATE OF date, status, departure_time, arrival_time, origin_id, destination_id ON flight
+            BEGIN
+                {remove_old}
+                {add_new}
+            END
+        """,
+    ]
+
+# recomputes the aggregates from the flight table. This is only needed when the aggregates are first created
+def rebuild_daily_aggregates(conn: sqlite3.Connection):
+    day, block = day_and_block_sql("f")
+
+    conn.execute("DELETE FROM airport_daily_flights")
+
+    conn.execute(f"""
+        INSERT INTO airport_daily_flights (airport_id, date, status, departures, block_seconds)
+        SELECT f.origin_id, {day} AS day, f.status, COUNT(*), SUM({block})
+        FROM flight f
+        GROUP BY f.origin_id, day, f.status
+    """)
+
+    conn.execute(f"""
+        INSERT INTO airport_daily_flights (airport_id, date, status, arrivals)
+        SELECT f.destination_id, {day} AS day, f.status, COUNT(*)
+        FROM flight f
+        GROUP BY f.destination_id, day, f.status
+        ON CONFLICT (airport_id, date, status) DO UPDATE SET
+            arrivals = excluded.arrivals
+    """)
+
+# this shows the departures and arrivals of every airport on a given day by status. It only reads the aggregates,
+# so it costs the same no matter how many flights there are
+def airport_operations_dashboard(conn: sqlite3.Connection):
+    flight_table = FlightTable()
+    date_column = flight_table.table_def.column_by_name("date")
+
+    day = flight_table.table_def.get_value(date_column, "Please enter the day to show the dashboard for: ")
+
+    statement = """
+        SELECT
+            a.icao_code AS airport,
+            d.status,
+            d.departures,
+            d.arrivals,
+            CASE WHEN d.departures > 0 THEN d.block_seconds / d.departures / 60 END AS avg_block_minutes
+        FROM airport_daily_flights d
+        JOIN airport a ON d.airport_id = a.id
+        WHERE d.date = ? AND (d.departures > 0 OR d.arrivals > 0)
+        ORDER BY a.icao_code, d.status
+    """
+
+    table = TableDef("airport_operations_dashboard", [
+        ColumnDef("airport", DataType.Text),
+        ColumnDef("status", DataType.Text),
+        ColumnDef("departures", DataType.Int),
+        ColumnDef("arrivals", DataType.Int),
+        ColumnDef("avg_block_minutes", DataType.Int, nullable=True),
+    ])
+
+    print(f"Airport operations on {day.inner.strftime('%Y-%m-%d')}")
+    results = table.find_records(conn.cursor(), statement, [day.inner.strftime("%Y-%m-%d")])
+    table.display_records(results)
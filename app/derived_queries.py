@@ -1,16 +1,34 @@
 import sqlite3
 
+from typing import Any, List, Tuple
+
 # local imports
 from .table import TableDef, ColumnDef, DataType
 from .flight import FlightTable
 from .pilot import PilotTable
 
+# each of the derived queries is described by the columns it produces, its statement and the bindings of the statement,
+# so that they can be run by the console as well as by anything else that does not prompt the user for input.
+# The columns of every query are defined once here rather than for every time it runs
+
 # this is a query that lists all pilots who have not been assigned to a flight
 # by left joining the pilot table with the flight_pilot table, which ensures that
 # the pilot records will be produced even if the joining table on the right side is null
 # this query does an additional left join with the airport table on pilot.home_airport_id = airport.id
 # in order to list the airport ICAO code of the pilot's home_airport
 def unassigned_pilots(conn: sqlite3.Connection):
+    table, statement, bindings = unassigned_pilots_query()
+
+    results = table.find_records(conn.cursor(), statement, bindings)
+    table.display_records(results)
+
+UNASSIGNED_PILOTS_TABLE = TableDef("unassigned_pilots", [
+    ColumnDef("pilot_id", DataType.Int),
+    ColumnDef("name", DataType.Text),
+    ColumnDef("home_airport", DataType.Text),
+])
+
+def unassigned_pilots_query() -> Tuple[TableDef, str, List[Any]]:
     statement = """
         SELECT 
             p.id AS pilot_id, 
@@ -22,14 +40,7 @@ def unassigned_pilots(conn: sqlite3.Connection):
         WHERE fp.flight_id IS NULL
     """
 
-    table = TableDef("unassigned_pilots", [
-        ColumnDef("pilot_id", DataType.Int),
-        ColumnDef("name", DataType.Text),
-        ColumnDef("home_airport", DataType.Text),
-    ])
-
-    results = table.find_records(conn.cursor(), statement)
-    table.display_records(results)
+    return UNASSIGNED_PILOTS_TABLE, statement, []
 
 # this is a query that produces information about which pilots have been assigned to a particular flight, including
 # if nobody has been assigned to the flight. This is because we are using a left join on the flights table, using the flight_pilot junction table to
@@ -43,6 +54,22 @@ def flight_pilot_assignments(conn: sqlite3.Connection):
     if maybe_flight is None:
         return
 
+    table, statement, bindings = flight_pilot_assignments_query(maybe_flight["id"].inner)
+
+    results = table.find_records(conn.cursor(), statement, bindings)
+    table.display_records(results)
+
+FLIGHT_PILOT_ASSIGNMENTS_TABLE = TableDef("flight_pilot_assignments", [
+    ColumnDef("pilot_id", DataType.Int, nullable=True),
+    ColumnDef("pilot_name", DataType.Text, nullable=True),
+    ColumnDef("flight_number", DataType.Text),
+    ColumnDef("date", DataType.Date),
+    ColumnDef("status", DataType.Text),
+    ColumnDef("origin", DataType.Text),
+    ColumnDef("destination", DataType.Text)
+])
+
+def flight_pilot_assignments_query(flight_id: int) -> Tuple[TableDef, str, List[Any]]:
     statement = """
         SELECT 
             p.id AS pilot_id, 
@@ -60,18 +87,7 @@ def flight_pilot_assignments(conn: sqlite3.Connection):
         WHERE f.id = ?
     """
 
-    table = TableDef("flight_pilot_assignments", [
-        ColumnDef("pilot_id", DataType.Int, nullable=True),
-        ColumnDef("pilot_name", DataType.Text, nullable=True),
-        ColumnDef("flight_number", DataType.Text),
-        ColumnDef("date", DataType.Date),
-        ColumnDef("status", DataType.Text),
-        ColumnDef("origin", DataType.Text),
-        ColumnDef("destination", DataType.Text)
-    ])
-
-    results = table.find_records(conn.cursor(), statement, [maybe_flight["id"].inner])
-    table.display_records(results)
+    return FLIGHT_PILOT_ASSIGNMENTS_TABLE, statement, [flight_id]
 
 # this is a query that joins flights and pilots via the flight_pilot junction table, joining on flight.id with
 # flight_pilot.flight_id and flight_pilot.pilot_id on pilot.id respectively. Note that this query uses inner joins when joining
@@ -87,7 +103,22 @@ def pilot_schedule(conn: sqlite3.Connection):
 
     if maybe_pilot is None:
         return
-    
+
+    table, statement, bindings = pilot_schedule_query(maybe_pilot["id"].inner)
+
+    results = table.find_records(conn.cursor(), statement, bindings)
+    table.display_records(results)
+
+PILOT_SCHEDULE_TABLE = TableDef("pilot_schedule", [
+    ColumnDef("flight_number", DataType.Text),
+    ColumnDef("status", DataType.Text),
+    ColumnDef("departure_time", DataType.DateTime),
+    ColumnDef("arrival_time", DataType.DateTime),
+    ColumnDef("origin", DataType.Text),
+    ColumnDef("destination", DataType.Text)
+])
+
+def pilot_schedule_query(pilot_id: int) -> Tuple[TableDef, str, List[Any]]:
     statement = """
         SELECT
             f.flight_number,
@@ -112,23 +143,25 @@ def pilot_schedule(conn: sqlite3.Connection):
             f.departure_time
     """
 
-    table = TableDef("pilot_schedule", [
-        ColumnDef("flight_number", DataType.Text),
-        ColumnDef("status", DataType.Text),
-        ColumnDef("departure_time", DataType.DateTime),
-        ColumnDef("arrival_time", DataType.DateTime),
-        ColumnDef("origin", DataType.Text),
-        ColumnDef("destination", DataType.Text)
-    ])
-
-    results = table.find_records(conn.cursor(), statement, [maybe_pilot["id"].inner])
-    table.display_records(results)
+    return PILOT_SCHEDULE_TABLE, statement, [pilot_id]
 
 # this is an aggregation query that counts the number of times each pilot visits each destination
 # and groups the results by pilot and destination. At the end the results are sorted by visits in
 # descending order. this query uses inner joins to join pilots and destinations via the flight_pilot junnction table
 # and therefore does not produce rows where the pilot never visits a destination
 def pilot_destination_frequencies(conn: sqlite3.Connection):
+    table, statement, bindings = pilot_destination_frequencies_query()
+
+    results = table.find_records(conn.cursor(), statement, bindings)
+    table.display_records(results)
+
+PILOT_DESTINATION_FREQUENCIES_TABLE = TableDef("pilot_destination_frequencies", [
+    ColumnDef("pilot", DataType.Text),
+    ColumnDef("destination", DataType.Text),
+    ColumnDef("visits", DataType.Int),
+])
+
+def pilot_destination_frequencies_query() -> Tuple[TableDef, str, List[Any]]:
     statement = """
         SELECT
             p.name AS pilot,
@@ -148,11 +181,4 @@ def pilot_destination_frequencies(conn: sqlite3.Connection):
             visits DESC
     """
     
-    table = TableDef("pilot_destination_frequencies", [
-        ColumnDef("pilot", DataType.Text),
-        ColumnDef("destination", DataType.Text),
-        ColumnDef("visits", DataType.Int),
-    ])
-
-    results = table.find_records(conn.cursor(), statement, [])
-    table.display_records(results)
\ No newline at end of file
+    return PILOT_DESTINATION_FREQUENCIES_TABLE, statement, []
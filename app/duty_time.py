@@ -0,0 +1,187 @@
+import bisect
+import itertools
+import sqlite3
+
+from typing import Dict, List, Tuple
+
+# numpy is optional, without it the same computations run over python lists
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# local imports
+from .table import TableDef, ColumnDef, DataType, Value
+from .flight import FlightTable
+
+SECONDS_PER_HOUR = 3600
+
+# the rolling windows over which block hours are summed, along with the most block hours allowed within each of them
+DUTY_WINDOWS: List[Tuple[str, int, float]] = [
+    ("24h", 24 * SECONDS_PER_HOUR, 10),
+    ("7d", 7 * 24 * SECONDS_PER_HOUR, 60),
+    ("28d", 28 * 24 * SECONDS_PER_HOUR, 100),
+]
+
+# the least amount of rest required between arriving and departing on the next assigned flight
+MIN_REST_HOURS = 10
+
+# the times of every pilot are shifted apart by this many seconds so that the flights of all pilots can be laid out
+# in a single sorted array without any window reaching back into the flights of the previous pilot
+PILOT_OFFSET = 10 ** 10
+
+class DutyTimes:
+    # the most block hours flown within each window by each pilot
+    max_block_hours: Dict[int, Dict[str, float]]
+    # the shortest rest between two consecutive flights by each pilot, None if the pilot flew at most once
+    min_rest_hours: Dict[int, float | None]
+
+    def __init__(self):
+        self.max_block_hours = {}
+        self.min_rest_hours = {}
+
+    def violations(self, pilot_id: int) -> List[str]:
+        violations: List[str] = []
+
+        for name, _, limit in DUTY_WINDOWS:
+            if self.max_block_hours[pilot_id][name] > limit:
+                violations.append(name)
+
+        min_rest = self.min_rest_hours[pilot_id]
+        if min_rest is not None and min_rest < MIN_REST_HOURS:
+            violations.append("rest")
+
+        return violations
+
+# computes the block hours in every rolling window ending at the arrival of each flight, along with the rest before
+# each flight, for all pilots at once. The inputs are ordered by pilot and then by departure. For every flight, the window
+# sum is the difference of two prefix sums of the block times, starting at the first flight that arrives within the window
+def compute_duty_times(pilot_ids: List[int], departures: List[int], arrivals: List[int]) -> DutyTimes:
+    duty_times = DutyTimes()
+    if len(pilot_ids) == 0:
+        return duty_times
+
+    if np is not None:
+        window_sums, rests = compute_windows_numpy(pilot_ids, departures, arrivals)
+    else:
+        window_sums, rests = compute_windows_python(pilot_ids, departures, arrivals)
+
+    for idx, pilot_id in enumerate(pilot_ids):
+        if pilot_id not in duty_times.max_block_hours:
+            duty_times.max_block_hours[pilot_id] = {name: 0.0 for name, _, _ in DUTY_WINDOWS}
+            duty_times.min_rest_hours[pilot_id] = None
+
+        for name, _, _ in DUTY_WINDOWS:
+            hours = window_sums[name][idx] / SECONDS_PER_HOUR
+            if hours > duty_times.max_block_hours[pilot_id][name]:
+                duty_times.max_block_hours[pilot_id][name] = hours
+
+        rest = rests[idx]
+        if rest is not None:
+            hours = rest / SECONDS_PER_HOUR
+            min_rest = duty_times.min_rest_hours[pilot_id]
+            if min_rest is None or hours < min_rest:
+                duty_times.min_rest_hours[pilot_id] = hours
+
+    return duty_times
+
+def compute_windows_numpy(pilot_ids: List[int], departures: List[int], arrivals: List[int]):
+    pilots = np.asarray(pilot_ids, dtype=np.int64)
+    # every change of pilot moves the times of all following flights another offset further apart
+    pilot_rank = np.concatenate(([0], np.cumsum(pilots[1:] != pilots[:-1])))
+    shifted_departures = np.asarray(departures, dtype=np.int64) + pilot_rank * PILOT_OFFSET
+    shifted_arrivals = np.asarray(arrivals, dtype=np.int64) + pilot_rank * PILOT_OFFSET
+
+    block_times = shifted_arrivals - shifted_departures
+    prefix = np.concatenate(([0], np.cumsum(block_times)))
+    # overlapping flights can arrive out of order, the running maximum keeps the arrivals sorted for the search
+    latest_arrivals = np.maximum.accumulate(shifted_arrivals)
+    positions = np.arange(len(pilots))
+
+    window_sums = {}
+    for name, length, _ in DUTY_WINDOWS:
+        window_starts = shifted_arrivals - length
+        first = np.searchsorted(latest_arrivals, window_starts, side="right")
+        # the first flight in the window may have departed before the window started. Only that flight is clipped,
+        # overlapping assignments are not expected here as they are caught by the schedule conflict checks
+        clipped = np.maximum(window_starts - shifted_departures[first], 0)
+        window_sums[name] = prefix[positions + 1] - prefix[first] - np.minimum(clipped, block_times[first])
+
+    gaps = shifted_departures[1:] - shifted_arrivals[:-1]
+    same_pilot = pilots[1:] == pilots[:-1]
+    rests = [None] + [int(gap) if same else None for gap, same in zip(gaps.tolist(), same_pilot.tolist())]
+
+    return {name: sums.tolist() for name, sums in window_sums.items()}, rests
+
+def compute_windows_python(pilot_ids: List[int], departures: List[int], arrivals: List[int]):
+    pilot_rank = list(itertools.accumulate([0] + [1 if current != previous else 0 for previous, current in zip(pilot_ids, pilot_ids[1:])]))
+    shifted_departures = [departure + rank * PILOT_OFFSET for departure, rank in zip(departures, pilot_rank)]
+    shifted_arrivals = [arrival + rank * PILOT_OFFSET for arrival, rank in zip(arrivals, pilot_rank)]
+
+    block_times = [arrival - departure for departure, arrival in zip(shifted_departures, shifted_arrivals)]
+    prefix = list(itertools.accumulate(block_times, initial=0))
+    latest_arrivals = list(itertools.accumulate(shifted_arrivals, max))
+
+    window_sums = {}
+    for name, length, _ in DUTY_WINDOWS:
+        sums: List[int] = []
+        for idx, arrival in enumerate(shifted_arrivals):
+            window_start = arrival - length
+            first = bisect.bisect_right(latest_arrivals, window_start)
+            clipped = max(window_start - shifted_departures[first], 0)
+            sums.append(prefix[idx + 1] - prefix[first] - min(clipped, block_times[first]))
+        window_sums[name] = sums
+
+    rests = [None] + [
+        shifted_departures[idx] - shifted_arrivals[idx - 1] if pilot_ids[idx] == pilot_ids[idx - 1] else None
+        for idx in range(1, len(pilot_ids))
+    ]
+
+    return window_sums, rests
+
+def load_assignment_times(conn: sqlite3.Connection) -> Tuple[List[int], List[int], List[int]]:
+    flight_table = FlightTable()
+    departure_column = flight_table.table_def.column_by_name("departure_time")
+    arrival_column = flight_table.table_def.column_by_name("arrival_time")
+
+    statement = f"""
+        SELECT
+            fp.pilot_id,
+            {departure_column.to_epoch_seconds_sql("f.departure_time")} AS departure_epoch,
+            {arrival_column.to_epoch_seconds_sql("f.arrival_time")} AS arrival_epoch
+        FROM flight_pilot fp
+        JOIN flight f ON fp.flight_id = f.id
+        ORDER BY fp.pilot_id, departure_epoch
+    """
+
+    rows = conn.execute(statement).fetchall()
+    return [row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows]
+
+# this lists the busiest rolling windows and the shortest rest of every pilot, flagging those that exceed the limits
+def pilot_duty_times(conn: sqlite3.Connection):
+    pilot_ids, departures, arrivals = load_assignment_times(conn)
+    duty_times = compute_duty_times(pilot_ids, departures, arrivals)
+
+    names = {row[0]: row[1] for row in conn.execute("SELECT id, name FROM pilot").fetchall()}
+
+    table = TableDef("pilot_duty_times", [
+        ColumnDef("pilot", DataType.Text),
+        *[ColumnDef(f"max_block_hours_{name}", DataType.Text) for name, _, _ in DUTY_WINDOWS],
+        ColumnDef("min_rest_hours", DataType.Text, nullable=True),
+        ColumnDef("violations", DataType.Text),
+    ])
+
+    results: List[dict[str, Value]] = []
+    for pilot_id, max_block_hours in duty_times.max_block_hours.items():
+        min_rest = duty_times.min_rest_hours[pilot_id]
+
+        record = {"pilot": Value.new_text(names.get(pilot_id, str(pilot_id)))}
+        for name, _, _ in DUTY_WINDOWS:
+            record[f"max_block_hours_{name}"] = Value.new_text(f"{max_block_hours[name]:.1f}")
+        record["min_rest_hours"] = Value.new_text(None if min_rest is None else f"{min_rest:.1f}")
+        record["violations"] = Value.new_text(", ".join(duty_times.violations(pilot_id)))
+
+        results.append(record)
+
+    print(f"Block hour limits: {', '.join([f'{limit}h per {name}' for name, _, limit in DUTY_WINDOWS])}. Minimum rest: {MIN_REST_HOURS}h")
+    table.display_records(results)
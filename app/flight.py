@@ -1,34 +1,54 @@
 import sqlite3
 
+from typing import List, Callable
+
 # local imports
-from .table import TableDef, ColumnDef, DataType, Value
+from .table import TableDef, ColumnDef, DataType, Value, StorageEncoding
+from .maintenance import scheduler
+from .transactions import writer
 from .airport import AirportTable
-from .util import binary_decision
+from .settings import create_settings_table, get_setting, set_setting
+from .util import binary_decision, clear_stdout
+
+# the setting under which the storage encoding of the flight date and time columns is persisted
+TEMPORAL_ENCODING_SETTING = "flight.temporal_encoding"
+
+# the definition of the flight table is shared by every handle to it, which means that changing the storage encoding
+# of its temporal columns applies everywhere. The columns start out in the text encoding until it is loaded from the database
+FLIGHT_TABLE_DEF = TableDef("flight", [
+    ColumnDef("id", DataType.Int),
+    ColumnDef("flight_number", DataType.Text),
+    ColumnDef("date", DataType.Date, encoding=StorageEncoding.Text),
+    ColumnDef(
+        "status",
+        DataType.Text,
+        allowed_values=[
+            Value.new_text("scheduled"),
+            Value.new_text("delayed"),
+            Value.new_text("boarding"),
+            Value.new_text("departed"),
+            Value.new_text("arrived")
+        ]
+    ),
+    ColumnDef("departure_time", DataType.DateTime, encoding=StorageEncoding.Text),
+    ColumnDef("arrival_time", DataType.DateTime, encoding=StorageEncoding.Text),
+    ColumnDef("origin_id", DataType.Int),
+    ColumnDef("destination_id", DataType.Int)
+])
 
 class FlightTable():
     table_def: TableDef
 
+    # the storage encoding of the date, departure_time and arrival_time columns. This is shared by all instances
+    # of the flight table since it describes the database and not a particular handle to it
+    temporal_encoding: StorageEncoding = StorageEncoding.Text
+
+    # callbacks that are told about the ids of flights after they were created, updated or removed, so that
+    # anything derived from the flight table in memory can be kept up to date without rereading the whole table
+    write_listeners: List[Callable[[sqlite3.Connection, List[int]], None]] = []
+
     def __init__(self):
-        self.table_def = TableDef("flight", [
-            ColumnDef("id", DataType.Int),
-            ColumnDef("flight_number", DataType.Text),
-            ColumnDef("date", DataType.Date),
-            ColumnDef(
-                "status",
-                DataType.Text,
-                allowed_values=[
-                    Value.new_text("scheduled"),
-                    Value.new_text("delayed"),
-                    Value.new_text("boarding"),
-                    Value.new_text("departed"),
-                    Value.new_text("arrived")
-                ]
-            ),
-            ColumnDef("departure_time", DataType.DateTime),
-            ColumnDef("arrival_time", DataType.DateTime),
-            ColumnDef("origin_id", DataType.Int),
-            ColumnDef("destination_id", DataType.Int)
-        ])
+        self.table_def = FLIGHT_TABLE_DEF
     
     def create_record(self, conn: sqlite3.Connection):
         # first get the values of all non-auto and non-foreign key fields
@@ -49,6 +69,9 @@ class FlightTable():
         values.append(maybe_origin["id"])
         values.append(maybe_destination["id"])
 
+        # the values are in the same order as the non-auto columns, which lets each column encode its own value
+        insertable_columns = [col for col in self.table_def.columns if col.name not in ["id"]]
+
         statement = f"""
             INSERT INTO {self.table_def.name} 
             (flight_number, date, status, departure_time, arrival_time, origin_id, destination_id)
@@ -56,8 +79,14 @@ class FlightTable():
             (?, ?, ?, ?, ?, ?, ?) 
         """
 
-        conn.execute(statement, [value.inner for value in values])
-        conn.commit()
+        # the values are only encoded inside the transaction, once the storage encoding has been read again
+        def insert(conn: sqlite3.Connection) -> sqlite3.Cursor:
+            bindings = [column.to_storage(value) for column, value in zip(insertable_columns, values)]
+            return conn.execute(statement, bindings)
+
+        cursor = writer.run(conn, insert)
+        scheduler.record_writes(conn, self.table_def.name)
+        FlightTable.notify_written(conn, [cursor.lastrowid])
 
         print("new flight created successfully")
 
@@ -100,20 +129,25 @@ class FlightTable():
             print(f"    {key}: {value_str}")
         
         if binary_decision("would you like to proceed with these changes?"):
-            update_set = [f"{column.name} = ?" for column in updateable_columns]
-            values = [record[column.name].inner for column in updateable_columns]
+            if len(updateable_columns) > 0:
+                statement = self.table_def.update_statement([column.name for column in updateable_columns])
 
-            if len(update_set) > 0:
-                statement = f"""
-                    UPDATE {self.table_def.name} SET {", ".join(update_set)} WHERE id = ?
-                """
+                def update(conn: sqlite3.Connection) -> sqlite3.Cursor:
+                    values = [column.to_storage(record[column.name]) for column in updateable_columns]
+                    values.append(record["id"].inner)
+                    return conn.execute(statement, values)
 
-                values.append(record["id"].inner)
-                conn.execute(statement, values)
-                conn.commit()
+                writer.run(conn, update)
+                scheduler.record_writes(conn, self.table_def.name)
+                FlightTable.notify_written(conn, [record["id"].inner])
 
                 print("existing flight udated successfully")
 
+    @staticmethod
+    def notify_written(conn: sqlite3.Connection, flight_ids: List[int]):
+        for listener in FlightTable.write_listeners:
+            listener(conn, flight_ids)
+
     def list_records(self, conn: sqlite3.Connection):
         records = self.table_def.find_records_with_conditions(conn.cursor())
         self.table_def.display_records(records)
@@ -136,4 +170,140 @@ class FlightTable():
         """
 
         conn.execute(statement)
-        conn.commit()
\ No newline at end of file
+
+        # schedules and rosters look up flights by the time they depart
+        conn.execute("CREATE INDEX IF NOT EXISTS flight_departure_time ON flight (departure_time)")
+        conn.commit()
+
+        self.load_temporal_encoding(conn)
+
+        # a write that was encoded for another storage encoding than the one of the database is rejected, which catches
+        # writes that do not go through the write executor and so never read the encoding again
+        expected_type = f"""(
+            CASE (SELECT value FROM setting WHERE key = '{TEMPORAL_ENCODING_SETTING}') WHEN 'Epoch' THEN 'integer' ELSE 'text' END
+        )"""
+        mismatch = " OR ".join([
+            f"typeof(NEW.{column.name}) != {expected_type}"
+            for column in self.table_def.columns if column.type in [DataType.Date, DataType.DateTime]
+        ])
+        error = "RAISE(ABORT, 'flight dates and times do not match the storage encoding of the database')"
+
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS flight_temporal_encoding_insert BEFORE INSERT ON flight
+            WHEN {mismatch}
+            BEGIN SELECT {error}; END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS flight_temporal_encoding_update BEFORE UPDATE OF date, departure_time, arrival_time ON flight
+            WHEN {mismatch}
+            BEGIN SELECT {error}; END
+        """)
+        conn.commit()
+
+    # reads the storage encoding of the temporal columns from the database and applies it to the column definitions
+    def load_temporal_encoding(self, conn: sqlite3.Connection):
+        create_settings_table(conn)
+        FlightTable.refresh_temporal_encoding(conn)
+
+    # another process may convert the flights to another encoding at any time. This is run at the start of every
+    # operation and of every write transaction, so that values are never encoded for an encoding read earlier
+    @staticmethod
+    def refresh_temporal_encoding(conn: sqlite3.Connection):
+        statement = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'setting'"
+        if conn.execute(statement).fetchone() is None:
+            return
+
+        encoding = StorageEncoding.Text
+        maybe_encoding = get_setting(conn, TEMPORAL_ENCODING_SETTING)
+        if maybe_encoding is not None:
+            encoding = StorageEncoding.__getitem__(maybe_encoding)
+
+        if encoding != FlightTable.temporal_encoding:
+            FlightTable().apply_temporal_encoding(encoding)
+
+    def apply_temporal_encoding(self, encoding: StorageEncoding):
+        FlightTable.temporal_encoding = encoding
+
+        for column in self.table_def.columns:
+            if column.type in [DataType.Date, DataType.DateTime]:
+                column.encoding = encoding
+
+    # rewrites the date, departure_time and arrival_time columns of every flight in the given encoding.
+    # flight tables in attached databases (such as the archive) are converted along with the main one.
+    # this runs in a single transaction, so the tables are never observed in a mixed encoding
+    def convert_temporal_encoding(self, conn: sqlite3.Connection, encoding: StorageEncoding) -> int:
+        schemas = self.schemas_with_table(conn)
+
+        def convert(conn: sqlite3.Connection) -> int:
+            # the setting is changed first, since the triggers on the flight table check the converted rows against it
+            set_setting(conn, TEMPORAL_ENCODING_SETTING, encoding.name)
+
+            converted = 0
+            for schema in schemas:
+                converted += self.convert_table_temporal_encoding(conn, f"{schema}.{self.table_def.name}", encoding)
+            return converted
+
+        converted = writer.run(conn, convert)
+
+        scheduler.record_writes(conn, self.table_def.name, converted)
+        self.apply_temporal_encoding(encoding)
+        return converted
+
+    # rewrites the flights of a single table that are stored in another encoding, within the transaction of the caller.
+    # This does not change the setting, which describes the main database
+    def convert_table_temporal_encoding(self, conn: sqlite3.Connection, table: str, encoding: StorageEncoding) -> int:
+        match encoding:
+            case StorageEncoding.Epoch:
+                statement = """
+                    UPDATE {table} SET
+                        date = CAST(strftime('%s', date) AS INTEGER) / 86400,
+                        departure_time = CAST(strftime('%s', departure_time) AS INTEGER),
+                        arrival_time = CAST(strftime('%s', arrival_time) AS INTEGER)
+                    WHERE typeof(date) = 'text'
+                """
+            case StorageEncoding.Text:
+                statement = """
+                    UPDATE {table} SET
+                        date = strftime('%Y-%m-%d %H:%M:%S', date * 86400, 'unixepoch'),
+                        departure_time = strftime('%Y-%m-%d %H:%M:%S', departure_time, 'unixepoch'),
+                        arrival_time = strftime('%Y-%m-%d %H:%M:%S', arrival_time, 'unixepoch')
+                    WHERE typeof(date) = 'integer'
+                """
+
+        return conn.execute(statement.format(table=table)).rowcount
+
+    # the type that sqlite reports for the dates and times stored in the given encoding
+    @staticmethod
+    def temporal_storage_type(encoding: StorageEncoding) -> str:
+        match encoding:
+            case StorageEncoding.Epoch:
+                return "integer"
+            case StorageEncoding.Text:
+                return "text"
+
+    # lists the names of all databases attached to the connection that contain a flight table
+    def schemas_with_table(self, conn: sqlite3.Connection) -> List[str]:
+        schemas: List[str] = []
+
+        for database in conn.execute("PRAGMA database_list").fetchall():
+            schema = database[1]
+            statement = f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?"
+            if conn.execute(statement, [self.table_def.name]).fetchone() is not None:
+                schemas.append(schema)
+
+        return schemas
+
+    def migrate_temporal_encoding(self, conn: sqlite3.Connection):
+        clear_stdout()
+
+        print(f"Flight dates and times are currently stored using the {FlightTable.temporal_encoding.name} encoding")
+
+        target = StorageEncoding.Text
+        if FlightTable.temporal_encoding == StorageEncoding.Text:
+            target = StorageEncoding.Epoch
+
+        if binary_decision(f"Would you like to convert them to the {target.name} encoding?"):
+            converted = self.convert_temporal_encoding(conn, target)
+            print(f"{converted} flights converted to the {target.name} encoding successfully")
+
+writer.begin_listeners.append(FlightTable.refresh_temporal_encoding)
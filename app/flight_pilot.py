@@ -1,18 +1,27 @@
 import sqlite3
 
+from typing import List, Tuple
+
 # local imports
 from .table import TableDef, ColumnDef, DataType
+from .maintenance import scheduler
+from .transactions import writer
 from .flight import FlightTable
 from .pilot import PilotTable
+from .schedule_conflicts import create_conflict_indexes, find_conflicts, check_assignments, RejectedAssignment
+from .util import binary_decision, clear_stdout
+
+# the definition of the flight_pilot table is shared by every handle to it
+FLIGHT_PILOT_TABLE_DEF = TableDef("flight_pilot", [
+    ColumnDef("flight_id", DataType.Int),
+    ColumnDef("pilot_id", DataType.Int)
+])
 
 class FlightPilotTable():
     table_def: TableDef
 
     def __init__(self):
-        self.table_def = TableDef("flight_pilot", [
-            ColumnDef("flight_id", DataType.Int),
-            ColumnDef("pilot_id", DataType.Int)
-        ])
+        self.table_def = FLIGHT_PILOT_TABLE_DEF
 
     def create_record(self, conn: sqlite3.Connection, flight_id: int, pilot_id: int):
         statement = f"""
@@ -22,8 +31,31 @@ class FlightPilotTable():
                 (?, ?) 
         """
 
-        conn.execute(statement, [flight_id, pilot_id])
-        conn.commit()
+        writer.execute(conn, statement, [flight_id, pilot_id])
+        scheduler.record_writes(conn, self.table_def.name)
+
+    # inserts a batch of (flight_id, pilot_id) assignments in a single transaction. Assignments that can not be made,
+    # such as those that would overlap with another flight of the same pilot unless conflicts are allowed, are left
+    # out. Returns the assignments that were created along with those that were rejected. The check runs in the same
+    # transaction as the insert, so concurrent imports can not both make overlapping assignments
+    def create_records(self, conn: sqlite3.Connection, assignments: List[Tuple[int, int]], allow_conflicts: bool = False) -> Tuple[List[Tuple[int, int]], List[RejectedAssignment]]:
+        statement = f"""
+            INSERT INTO flight_pilot
+                (flight_id, pilot_id)
+            VALUES
+                (?, ?) 
+        """
+
+        def create(conn: sqlite3.Connection) -> Tuple[List[Tuple[int, int]], List[RejectedAssignment]]:
+            accepted, rejected = check_assignments(conn, assignments, allow_conflicts)
+            conn.executemany(statement, accepted)
+            return accepted, rejected
+
+        created, rejected = writer.run(conn, create)
+
+        scheduler.record_writes(conn, self.table_def.name, len(created))
+
+        return created, rejected
 
     def delete_record(self, conn: sqlite3.Connection, flight_id: int, pilot_id: int):
         statement = f"""
@@ -31,8 +63,8 @@ class FlightPilotTable():
             WHERE flight_id = ? AND pilot_id = ?
         """
 
-        conn.execute(statement, [flight_id, pilot_id])
-        conn.commit()
+        writer.execute(conn, statement, [flight_id, pilot_id])
+        scheduler.record_writes(conn, self.table_def.name)
 
     def assign_pilot_to_flight(self, conn: sqlite3.Connection):
         flight_table = FlightTable()
@@ -49,10 +81,50 @@ class FlightPilotTable():
 
         if maybe_pilot is None:
             return
+
+        conflicts = find_conflicts(conn, maybe_flight["id"].inner, maybe_pilot["id"].inner)
+        if len(conflicts) > 0:
+            print("The pilot is already assigned to the following flights during the time of this flight:")
+            flight_table.table_def.display_records(conflicts)
+
+            if not binary_decision("would you like to assign the pilot anyway?"):
+                return
         
         self.create_record(conn, maybe_flight["id"].inner, maybe_pilot["id"].inner)
         print("pilot assigned to flight successfully")
 
+    # imports assignments from a file with one flight_id,pilot_id pair per line
+    def import_assignments(self, conn: sqlite3.Connection):
+        clear_stdout()
+
+        path = input("Please enter the file to import pilot assignments from: ")
+
+        assignments: List[Tuple[int, int]] = []
+        try:
+            with open(path, "r") as lines:
+                for line_number, line in enumerate(lines):
+                    if line.strip() == "":
+                        continue
+
+                    try:
+                        flight_id, pilot_id = [int(field) for field in line.split(",")]
+                    except ValueError:
+                        print(f"Skipping line {line_number + 1}, expected a flight_id,pilot_id pair but got: {line.strip()}")
+                        continue
+
+                    assignments.append((flight_id, pilot_id))
+        except OSError:
+            print(f"The file {path} could not be read")
+            return
+
+        allow_conflicts = binary_decision("Would you like to import assignments that overlap with other flights of the same pilot?")
+        created, rejected = self.create_records(conn, assignments, allow_conflicts)
+
+        for rejection in rejected:
+            print(f"    skipped: {rejection.to_str()}")
+
+        print(f"{len(created)} pilot assignments imported successfully")
+
     def unassign_pilot_from_flight(self, conn: sqlite3.Connection):
         flight_table = FlightTable()
         pilot_table = PilotTable()
@@ -85,3 +157,5 @@ class FlightPilotTable():
 
         conn.execute(statement)
         conn.commit()
+
+        create_conflict_indexes(conn)
@@ -0,0 +1,532 @@
+import json
+import os
+import queue
+import selectors
+import socket
+import sqlite3
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl
+
+# local imports
+from .table import TableDef, SelectCondition, SelectOperator, Value, DataType
+from .connection import open_connection, database_path
+from .maintenance import scheduler
+from .airport import AIRPORT_TABLE_DEF
+from .pilot import PILOT_TABLE_DEF
+from .flight import FlightTable, FLIGHT_TABLE_DEF
+from .flight_pilot import FlightPilotTable, FLIGHT_PILOT_TABLE_DEF
+from .derived_queries import unassigned_pilots_query, flight_pilot_assignments_query, pilot_schedule_query, pilot_destination_frequencies_query
+
+HTTP_HOST = "127.0.0.1"
+DEFAULT_HTTP_PORT = 8080
+DEFAULT_HTTP_WORKERS = 64
+
+# the environment variables that override the port to listen on and the number of requests served at the same time
+HTTP_PORT_ENVIRONMENT_VARIABLE = "AIRLINE_HTTP_PORT"
+HTTP_WORKERS_ENVIRONMENT_VARIABLE = "AIRLINE_HTTP_WORKERS"
+
+# kept-alive connections that stay idle for this many seconds are closed. An idle connection does not hold on to a
+# worker, so the number of open connections is not limited by the number of workers. The same timeout applies to
+# reading a request once it has started to arrive
+KEEP_ALIVE_TIMEOUT = 5
+
+# the range of values accepted for the overrides of the port and the number of workers
+MAX_HTTP_WORKERS = 1024
+
+# streamed results are sent in chunks of roughly this many bytes
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# the tables that can be listed and written to
+TABLES: Dict[str, TableDef] = {
+    "airport": AIRPORT_TABLE_DEF,
+    "pilot": PILOT_TABLE_DEF,
+    "flight": FLIGHT_TABLE_DEF,
+    "flight_pilot": FLIGHT_PILOT_TABLE_DEF,
+}
+
+# the derived queries by name, each of them takes the query parameters of the request
+QUERIES: Dict[str, Callable[[Dict[str, List[str]]], Tuple[TableDef, str, List[Any]]]] = {
+    "unassigned_pilots": lambda params: unassigned_pilots_query(),
+    "flight_pilot_assignments": lambda params: flight_pilot_assignments_query(int_param(params, "flight_id")),
+    "pilot_schedule": lambda params: pilot_schedule_query(int_param(params, "pilot_id")),
+    "pilot_destination_frequencies": lambda params: pilot_destination_frequencies_query(),
+}
+
+class RequestError(Exception):
+    status: int
+    message: str
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+# every worker thread keeps its own connection, sqlite connections can not be shared between threads
+thread_connections = threading.local()
+
+def thread_connection(path: str) -> sqlite3.Connection:
+    conn = getattr(thread_connections, "conn", None)
+    if conn is None:
+        conn = open_connection(path)
+        thread_connections.conn = conn
+
+    return conn
+
+# an http server that hands every request to a fixed pool of worker threads, rather than starting a new thread for every
+# connection. A worker serves a single request of a connection at a time. Kept-alive connections are then handed to a
+# watcher thread, which waits for their next request without holding on to a worker, so that idle clients never keep
+# new connections from being served
+class PooledHTTPServer(HTTPServer):
+    request_queue_size = 256
+    database_path: str
+    executor: ThreadPoolExecutor
+    # the connections that finished a request and are waiting for the next one, handed to the watcher thread
+    idle_handlers: "queue.Queue[Optional[ServiceRequestHandler]]"
+    # written to by the workers to wake the watcher thread when an idle connection was handed to it
+    wakeup_reader: socket.socket
+    wakeup_writer: socket.socket
+    watcher: threading.Thread
+
+    def __init__(self, address: Tuple[str, int], database_path: str, workers: int):
+        super().__init__(address, ServiceRequestHandler)
+        self.database_path = database_path
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http-worker")
+        self.idle_handlers = queue.Queue()
+        self.wakeup_reader, self.wakeup_writer = socket.socketpair()
+        self.watcher = threading.Thread(target=self.watch_idle_connections, name="http-keep-alive", daemon=True)
+        self.watcher.start()
+
+    def process_request(self, request, client_address):
+        self.submit(ServiceRequestHandler(request, client_address, self))
+
+    def submit(self, handler: "ServiceRequestHandler"):
+        try:
+            self.executor.submit(self.serve_request, handler)
+        except RuntimeError:
+            # the server is shutting down and no longer serves requests
+            self.close_connection(handler)
+
+    def serve_request(self, handler: "ServiceRequestHandler"):
+        try:
+            handler.handle_next_request()
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+            handler.close_connection = True
+
+        if handler.close_connection:
+            self.close_connection(handler)
+        elif handler.has_buffered_request():
+            # a pipelined request has already been read into the buffer of the handler, so the socket never becomes readable for it
+            self.submit(handler)
+        else:
+            self.idle_handlers.put(handler)
+            self.wakeup_writer.send(b"\0")
+
+    def close_connection(self, handler: "ServiceRequestHandler"):
+        try:
+            handler.finish()
+        except OSError:
+            pass
+        self.shutdown_request(handler.request)
+
+    # waits for the next request on every idle connection and hands it back to the workers once it arrives.
+    # Connections that stay idle for longer than the keep alive timeout are closed
+    def watch_idle_connections(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self.wakeup_reader, selectors.EVENT_READ)
+        idle_since: Dict[ServiceRequestHandler, float] = {}
+
+        while True:
+            for key, _ in selector.select(timeout=1):
+                if key.fileobj is self.wakeup_reader:
+                    self.wakeup_reader.recv(4096)
+                    continue
+
+                handler = key.data
+                selector.unregister(handler.request)
+                del idle_since[handler]
+                self.submit(handler)
+
+            while not self.idle_handlers.empty():
+                maybe_handler = self.idle_handlers.get()
+                if maybe_handler is None:
+                    for handler in idle_since.keys():
+                        self.close_connection(handler)
+                    selector.close()
+                    return
+
+                selector.register(maybe_handler.request, selectors.EVENT_READ, maybe_handler)
+                idle_since[maybe_handler] = time.monotonic()
+
+            now = time.monotonic()
+            for handler in [handler for handler, since in idle_since.items() if now - since > KEEP_ALIVE_TIMEOUT]:
+                selector.unregister(handler.request)
+                del idle_since[handler]
+                self.close_connection(handler)
+
+    def server_close(self):
+        super().server_close()
+
+        self.idle_handlers.put(None)
+        self.wakeup_writer.send(b"\0")
+        self.watcher.join()
+
+        self.executor.shutdown(wait=True)
+
+        # the connections kept alive by the requests that were still being served when the watcher stopped
+        while not self.idle_handlers.empty():
+            maybe_handler = self.idle_handlers.get()
+            if maybe_handler is not None:
+                self.close_connection(maybe_handler)
+
+        self.wakeup_reader.close()
+        self.wakeup_writer.close()
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive between requests
+    protocol_version = "HTTP/1.1"
+    timeout = KEEP_ALIVE_TIMEOUT
+    server: PooledHTTPServer
+    body: bytes
+
+    # unlike the base class, which serves every request of the connection from its constructor, a handler is created
+    # once per connection and the server asks it to serve one request at a time whenever the connection has one waiting
+    def __init__(self, request, client_address, server):
+        self.request = request
+        self.client_address = client_address
+        self.server = server
+        self.setup()
+
+    def handle_next_request(self):
+        self.close_connection = True
+        self.handle_one_request()
+
+    # whether the start of another request was already read from the socket along with the previous one
+    def has_buffered_request(self) -> bool:
+        self.connection.setblocking(False)
+        try:
+            return len(self.rfile.peek(1)) > 0
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def do_GET(self):
+        self.dispatch(lambda conn, parts, params: self.route_get(conn, parts, params))
+
+    def do_POST(self):
+        self.dispatch(lambda conn, parts, params: self.route_post(conn, parts, params))
+
+    def do_PATCH(self):
+        self.dispatch(lambda conn, parts, params: self.route_patch(conn, parts, params))
+
+    def do_DELETE(self):
+        self.dispatch(lambda conn, parts, params: self.route_delete(conn, parts, params))
+
+    def dispatch(self, route: Callable[[sqlite3.Connection, List[str], Dict[str, List[str]]], None]):
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split("/") if part != ""]
+
+        params: Dict[str, List[str]] = {}
+        for key, val in parse_qsl(url.query, keep_blank_values=True):
+            params.setdefault(key, []).append(val)
+
+        # the body is always read, so that the connection can be kept alive even when the request is rejected
+        length = int(self.headers.get("Content-Length") or 0)
+        self.body = self.rfile.read(length) if length > 0 else b""
+
+        conn = thread_connection(self.server.database_path)
+        try:
+            # the storage encoding of the flight dates is shared by all threads and may be changed by another process
+            FlightTable.refresh_temporal_encoding(conn)
+            route(conn, parts, params)
+        except RequestError as e:
+            self.send_json(e.status, {"error": e.message})
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            self.send_json(409, {"error": str(e)})
+        except sqlite3.OperationalError as e:
+            conn.rollback()
+            self.send_json(503, {"error": str(e)})
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+
+    def route_get(self, conn: sqlite3.Connection, parts: List[str], params: Dict[str, List[str]]):
+        match parts:
+            case ["tables", table_name]:
+                table = find_table(table_name)
+                statement, bindings = table.select_statement(parse_conditions(table, params))
+                self.send_records(table, table.stream_records(conn.cursor(), statement, bindings))
+            case ["queries", query_name]:
+                if query_name not in QUERIES:
+                    raise RequestError(404, f"unknown query: {query_name}")
+
+                table, statement, bindings = QUERIES[query_name](params)
+                self.send_records(table, table.stream_records(conn.cursor(), statement, bindings))
+            case _:
+                raise RequestError(404, f"unknown path: {self.path}")
+
+    def route_post(self, conn: sqlite3.Connection, parts: List[str], params: Dict[str, List[str]]):
+        match parts:
+            case ["tables", "flight_pilot"]:
+                raise RequestError(405, "pilots are assigned to flights through /assignments")
+            case ["tables", table_name]:
+                table = find_table(table_name)
+                values = parse_values(table, self.read_json(), require_all=True)
+
+                id = table.insert_values(conn, values)
+                record_written(conn, table, [id])
+
+                self.send_json(201, {"id": id})
+            case ["assignments"]:
+                self.create_assignments(conn, self.read_json())
+            case _:
+                raise RequestError(404, f"unknown path: {self.path}")
+
+    def route_patch(self, conn: sqlite3.Connection, parts: List[str], params: Dict[str, List[str]]):
+        match parts:
+            case ["tables", "flight_pilot", _]:
+                raise RequestError(405, "assignments can not be updated, only created and deleted")
+            case ["tables", table_name, id]:
+                table = find_table(table_name)
+                values = parse_values(table, self.read_json(), require_all=False)
+                if len(values) == 0:
+                    raise RequestError(400, "no values to update were given")
+
+                if table.update_values(conn, parse_int(id, "id"), values) == 0:
+                    raise RequestError(404, f"{table_name} with id {id} does not exist")
+                record_written(conn, table, [int(id)])
+
+                self.send_json(200, {"id": int(id)})
+            case _:
+                raise RequestError(404, f"unknown path: {self.path}")
+
+    def route_delete(self, conn: sqlite3.Connection, parts: List[str], params: Dict[str, List[str]]):
+        match parts:
+            case ["assignments"]:
+                flight_id = int_param(params, "flight_id")
+                pilot_id = int_param(params, "pilot_id")
+
+                FlightPilotTable().delete_record(conn, flight_id, pilot_id)
+                self.send_json(200, {"flight_id": flight_id, "pilot_id": pilot_id})
+            case _:
+                raise RequestError(404, f"unknown path: {self.path}")
+
+    # accepts a single {"flight_id": ..., "pilot_id": ...} object or a list of them. Assignments that overlap with
+    # another flight of the same pilot are only made when the request sets allow_conflicts
+    def create_assignments(self, conn: sqlite3.Connection, body: Any):
+        items = body if isinstance(body, list) else [body]
+
+        assignments: List[Tuple[int, int]] = []
+        allow_conflicts = False
+        for item in items:
+            if not isinstance(item, dict):
+                raise RequestError(400, "expected an object with a flight_id and a pilot_id")
+
+            assignments.append((parse_int(item.get("flight_id"), "flight_id"), parse_int(item.get("pilot_id"), "pilot_id")))
+            allow_conflicts = allow_conflicts or item.get("allow_conflicts") is True
+
+        created, rejected = FlightPilotTable().create_records(conn, assignments, allow_conflicts)
+
+        result = {
+            "assigned": len(created),
+            "created": [{"flight_id": flight_id, "pilot_id": pilot_id} for flight_id, pilot_id in created],
+            "rejected": [
+                {
+                    "flight_id": rejection.flight_id,
+                    "pilot_id": rejection.pilot_id,
+                    "reason": rejection.reason,
+                    "conflicting_flight_ids": rejection.conflicting_flight_ids,
+                }
+                for rejection in rejected
+            ],
+        }
+        # the request only failed as a whole when nothing could be assigned, otherwise the client needs to know which
+        # assignments were made, so that it does not retry them
+        self.send_json(409 if len(created) == 0 and len(rejected) > 0 else 201, result)
+
+    def read_json(self) -> Any:
+        if len(self.body) == 0:
+            raise RequestError(400, "expected a json request body")
+
+        return json.loads(self.body)
+
+    def send_json(self, status: int, body: Any):
+        encoded = json.dumps(body).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    # sends the records as a json array using chunked transfer encoding, so that large results are written out
+    # while they are being read from the database. The first record is read before the response is started,
+    # which means that errors in the statement can still be reported with an error status
+    def send_records(self, table: TableDef, records: Iterator[dict[str, Value]]):
+        first = next(records, None)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        buffer: List[str] = ["["]
+        size = 1
+        try:
+            for idx, record in enumerate(prepend(first, records)):
+                encoded = json.dumps(record_to_json(table, record))
+                if idx > 0:
+                    encoded = "," + encoded
+
+                buffer.append(encoded)
+                size += len(encoded)
+                if size >= STREAM_CHUNK_SIZE:
+                    self.write_chunk("".join(buffer))
+                    buffer = []
+                    size = 0
+        except (sqlite3.Error, ValueError) as e:
+            # the status has already been sent, the only way left to signal the failure is to cut the response short
+            self.log_error("streaming %s failed: %s", table.name, str(e))
+            self.close_connection = True
+            return
+
+        buffer.append("]")
+        self.write_chunk("".join(buffer))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, data: str):
+        encoded = data.encode("utf-8")
+        self.wfile.write(f"{len(encoded):x}\r\n".encode("ascii") + encoded + b"\r\n")
+
+    # only errors are logged, logging every request would slow down the workers considerably
+    def log_request(self, code="-", size="-"):
+        pass
+
+def find_table(table_name: str) -> TableDef:
+    if table_name not in TABLES:
+        raise RequestError(404, f"unknown table: {table_name}")
+
+    return TABLES[table_name]
+
+# parses filters given as query parameters of the form column=Operator:value into select conditions.
+# The operator is one of the names of SelectOperator and defaults to Eq, e.g. ?status=scheduled&departure_time=Gte:2024-05-01 00:00:00
+def parse_conditions(table: TableDef, params: Dict[str, List[str]]) -> List[SelectCondition]:
+    conditions: List[SelectCondition] = []
+
+    for column_name, vals in params.items():
+        column = table.column_by_name(column_name)
+
+        for val in vals:
+            operator = SelectOperator.Eq
+            operator_name, _, rest = val.partition(":")
+            if operator_name in SelectOperator.__members__:
+                operator = SelectOperator[operator_name]
+                val = rest
+
+            conditions.append(SelectCondition(column, operator, column.parse_value(val)))
+
+    return conditions
+
+# parses the values of a json object keyed by column name, the ids are always assigned by the database
+def parse_values(table: TableDef, body: Any, require_all: bool) -> dict[str, Value]:
+    if not isinstance(body, dict):
+        raise RequestError(400, "expected a json object keyed by column name")
+
+    if "id" in body:
+        raise RequestError(400, "the id of a record can not be set")
+
+    values: dict[str, Value] = {}
+    for column_name, val in body.items():
+        column = table.column_by_name(column_name)
+        value = column.parse_value(val)
+
+        if value.inner is not None and not column.is_allowed(value):
+            allowed = ", ".join([allowed_value.to_str() for allowed_value in column.allowed_values or []])
+            raise RequestError(400, f"{value.to_str()} is not allowed for column {column_name}, expected one of: {allowed}")
+
+        values[column_name] = value
+
+    if require_all:
+        missing = [column.name for column in table.columns if column.name != "id" and column.name not in values and not column.nullable]
+        if len(missing) > 0:
+            raise RequestError(400, f"missing values for columns: {', '.join(missing)}")
+
+    return values
+
+def parse_int(val: Any, name: str) -> int:
+    try:
+        return int(val)
+    except (TypeError, ValueError):
+        raise RequestError(400, f"expected an integer {name}")
+
+def int_param(params: Dict[str, List[str]], name: str) -> int:
+    if name not in params:
+        raise RequestError(400, f"missing query parameter: {name}")
+
+    return parse_int(params[name][0], name)
+
+def record_to_json(table: TableDef, record: dict[str, Value]) -> dict[str, Any]:
+    return {column.name: value_to_json(record[column.name]) for column in table.columns}
+
+def value_to_json(value: Value) -> Any:
+    if value.inner is None:
+        return None
+
+    match value.type:
+        case DataType.Int | DataType.Text:
+            return value.inner
+        case _:
+            return value.to_str()
+
+def prepend(first: Any, rest: Iterator[Any]) -> Iterable[Any]:
+    if first is not None:
+        yield first
+    yield from rest
+
+# the same bookkeeping the console does after every write
+def record_written(conn: sqlite3.Connection, table: TableDef, ids: List[int]):
+    scheduler.record_writes(conn, table.name, len(ids))
+
+    if table.name == "flight":
+        FlightTable.notify_written(conn, ids)
+
+# serves the tables and derived queries over http until interrupted. The database is switched to write-ahead logging,
+# which lets the workers keep reading while another worker writes
+def serve_http(conn: sqlite3.Connection):
+    conn.execute("PRAGMA journal_mode = WAL")
+
+    port = int_environment_variable(HTTP_PORT_ENVIRONMENT_VARIABLE, DEFAULT_HTTP_PORT, 1, 65535)
+    workers = int_environment_variable(HTTP_WORKERS_ENVIRONMENT_VARIABLE, DEFAULT_HTTP_WORKERS, 1, MAX_HTTP_WORKERS)
+
+    server = PooledHTTPServer((HTTP_HOST, port), database_path(conn), workers)
+    print(f"Serving on http://{HTTP_HOST}:{port} with {workers} workers, press Ctrl+C to stop")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+# reads an integer override from the environment, falling back to the default when it is not a number in range
+def int_environment_variable(name: str, default: int, minimum: int, maximum: int) -> int:
+    maybe_value = os.environ.get(name)
+    if maybe_value is None:
+        return default
+
+    try:
+        value = int(maybe_value)
+    except ValueError:
+        value = minimum - 1
+
+    if value < minimum or value > maximum:
+        print(f"Ignoring {name}, expected a number from {minimum} to {maximum} but got: {maybe_value}. Using {default} instead")
+        return default
+
+    return value
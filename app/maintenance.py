@@ -0,0 +1,88 @@
+import sqlite3
+import threading
+import time
+
+from typing import Dict, List
+
+# local imports
+from .transactions import writer, is_lock_error
+from .util import clear_stdout, binary_decision
+
+# the number of rows that may be written to a table before its planner statistics are refreshed
+ANALYZE_WRITE_THRESHOLD = 1000
+
+# this keeps track of how many rows have been written to each table since its statistics were last
+# refreshed, so that ANALYZE only ever runs against tables that have changed substantially
+class MaintenanceScheduler:
+    write_counts: Dict[str, int]
+    analyze_threshold: int
+    # the counters may be updated from several threads, such as by the workers of the http service
+    lock: threading.Lock
+
+    def __init__(self, analyze_threshold: int = ANALYZE_WRITE_THRESHOLD):
+        self.write_counts = {}
+        self.analyze_threshold = analyze_threshold
+        self.lock = threading.Lock()
+
+    # this should be called after every committed write with the number of rows that were written
+    def record_writes(self, conn: sqlite3.Connection, table_name: str, count: int = 1):
+        with self.lock:
+            self.write_counts[table_name] = self.write_counts.get(table_name, 0) + count
+
+            due = self.write_counts[table_name] >= self.analyze_threshold
+            if due:
+                self.write_counts[table_name] = 0
+
+        if not due:
+            return
+
+        # the write that triggered this has already been committed, so the statistics staying locked must not fail it.
+        # The count is restored instead, so that the table is analyzed again after its next write
+        try:
+            self.analyze(conn, [table_name])
+        except sqlite3.OperationalError as e:
+            if not is_lock_error(e):
+                raise e
+
+            with self.lock:
+                self.write_counts[table_name] = self.write_counts.get(table_name, 0) + self.analyze_threshold
+
+    # ANALYZE writes the statistics to sqlite_stat1, so it is run as a write transaction like any other
+    def analyze(self, conn: sqlite3.Connection, table_names: List[str]):
+        def run(conn: sqlite3.Connection):
+            for table_name in table_names:
+                conn.execute(f"ANALYZE {table_name}")
+
+        writer.run(conn, run)
+
+    # PRAGMA optimize only analyzes the tables whose statistics the planner would actually benefit from,
+    # which makes it cheap enough to run every time a connection is closed
+    def optimize(self, conn: sqlite3.Connection):
+        conn.execute("PRAGMA optimize")
+
+        with self.lock:
+            self.write_counts.clear()
+
+    def run_maintenance(self, conn: sqlite3.Connection):
+        clear_stdout()
+
+        if binary_decision("Would you like to refresh the planner statistics of all tables (ANALYZE)?"):
+            started = time.perf_counter()
+            writer.run(conn, lambda conn: conn.execute("ANALYZE"))
+
+            with self.lock:
+                self.write_counts.clear()
+            print(f"ANALYZE completed in {time.perf_counter() - started:.3f}s")
+
+        if binary_decision("Would you like to rebuild the database file to reclaim unused space (VACUUM)?"):
+            page_count_before = conn.execute("PRAGMA page_count").fetchone()[0]
+
+            started = time.perf_counter()
+            conn.execute("VACUUM")
+            elapsed = time.perf_counter() - started
+
+            page_count_after = conn.execute("PRAGMA page_count").fetchone()[0]
+            print(f"VACUUM completed in {elapsed:.3f}s ({page_count_before} pages before, {page_count_after} pages after)")
+
+# this is the scheduler shared by all table write paths
+scheduler = MaintenanceScheduler()
@@ -0,0 +1,195 @@
+import csv
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import time
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+from urllib.request import pathname2url
+
+# local imports
+from .table import Value
+from .connection import open_read_only_connection, database_path
+from .flight import FlightTable
+from .archive import ARCHIVE_PATH, ARCHIVE_SCHEMA, attach_archive
+from .derived_queries import PILOT_DESTINATION_FREQUENCIES_TABLE
+from .util import binary_decision, clear_stdout
+
+# the number of worker processes, every worker reads its shards through its own connection
+PARALLEL_WORKERS = os.cpu_count() or 1
+
+# the flights are split into this many shards per worker, so that a worker that finishes early picks up
+# another shard instead of waiting for the slowest one
+SHARDS_PER_WORKER = 4
+
+# a shard covers the flights with a stored date from low up to but excluding high. The last shard has no upper bound
+Shard = Tuple[Any, Optional[Any]]
+
+# the shards are found by their date, which is only cheap to look up with an index on it
+def create_report_indexes(conn: sqlite3.Connection):
+    conn.execute("CREATE INDEX IF NOT EXISTS flight_date ON flight (date)")
+    conn.commit()
+
+# splits the flights into shards of roughly the same number of flights. The bounds are the stored dates themselves,
+# so they compare correctly against the date column in whichever encoding it is stored
+def plan_shards(conn: sqlite3.Connection, schemas: List[str], count: int) -> List[Shard]:
+    flights_per_date: Counter = Counter()
+    for schema in schemas:
+        for row in conn.execute(f"SELECT date, COUNT(*) FROM {schema}.flight GROUP BY date").fetchall():
+            flights_per_date[row[0]] += row[1]
+
+    dates = sorted(flights_per_date.keys())
+    if len(dates) == 0:
+        return []
+
+    target = sum(flights_per_date.values()) / count
+
+    lows = [dates[0]]
+    in_shard = 0
+    for date in dates:
+        if in_shard >= target:
+            lows.append(date)
+            in_shard = 0
+        in_shard += flights_per_date[date]
+
+    return [(low, lows[idx + 1] if idx + 1 < len(lows) else None) for idx, low in enumerate(lows)]
+
+def shard_condition(column: str, shard: Shard) -> Tuple[str, List[Any]]:
+    low, high = shard
+    if high is None:
+        return f"{column} >= ?", [low]
+
+    return f"{column} >= ? AND {column} < ?", [low, high]
+
+# the worker processes are started fresh rather than forked. Forking copies the open connections of the parent and
+# can deadlock on locks held by its other threads, such as the background backups, at the moment of the fork
+WORKER_START_METHOD = "spawn"
+
+# the connection of the worker process, opened once when the worker starts
+worker_conn: Optional[sqlite3.Connection] = None
+
+def init_worker(path: str, archive_path: Optional[str]):
+    global worker_conn
+
+    worker_conn = open_read_only_connection(path)
+    if archive_path is not None:
+        worker_conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", [f"file:{pathname2url(archive_path)}?mode=ro"])
+
+    # a started worker does not inherit the storage encoding of the flight dates that the parent has loaded
+    FlightTable.refresh_temporal_encoding(worker_conn)
+
+# the schemas holding the flights a report runs over, the archive is attached when it is included
+def report_schemas(conn: sqlite3.Connection, include_archive: bool) -> List[str]:
+    if not include_archive:
+        return ["main"]
+
+    attach_archive(conn)
+    return ["main", ARCHIVE_SCHEMA]
+
+# runs task over every shard in a pool of worker processes, returning the results in shard order. Every call of
+# task receives the schemas and its shard, followed by the arguments given for that shard
+def run_sharded(conn: sqlite3.Connection, task: Callable[..., Any], schemas: List[str], shards: List[Shard], args: List[Tuple[Any, ...]] | None = None) -> List[Any]:
+    archive_path = os.path.abspath(ARCHIVE_PATH) if ARCHIVE_SCHEMA in schemas else None
+    if args is None:
+        args = [() for _ in shards]
+
+    context = multiprocessing.get_context(WORKER_START_METHOD)
+
+    with ProcessPoolExecutor(max_workers=PARALLEL_WORKERS, mp_context=context, initializer=init_worker, initargs=(database_path(conn), archive_path)) as executor:
+        futures = [executor.submit(task, schemas, shard, *shard_args) for shard, shard_args in zip(shards, args)]
+        return [future.result() for future in futures]
+
+# counts the visits of every pilot to every destination among the flights of a shard
+def count_destinations(schemas: List[str], shard: Shard) -> Counter:
+    condition, bindings = shard_condition("f.date", shard)
+
+    visits: Counter = Counter()
+    for schema in schemas:
+        statement = f"""
+            SELECT fp.pilot_id, f.destination_id, COUNT(*)
+            FROM {schema}.flight f
+            JOIN {schema}.flight_pilot fp ON fp.flight_id = f.id
+            WHERE {condition}
+            GROUP BY fp.pilot_id, f.destination_id
+        """
+
+        for row in worker_conn.execute(statement, bindings):
+            visits[(row[0], row[1])] += row[2]
+
+    return visits
+
+# writes the flights of a shard to the given file as csv rows without a header, ordered by date
+def export_shard(schemas: List[str], shard: Shard, path: str) -> int:
+    table = FlightTable().table_def
+    condition, bindings = shard_condition("date", shard)
+
+    statement = " UNION ALL ".join([f"SELECT * FROM {schema}.flight WHERE {condition}" for schema in schemas])
+    statement = f"{statement} ORDER BY date, id"
+
+    exported = 0
+    with open(path, "w", newline="") as out:
+        writer = csv.writer(out)
+        for record in table.stream_records(worker_conn.cursor(), statement, bindings * len(schemas)):
+            writer.writerow(["" if record[column.name].inner is None else record[column.name].to_str() for column in table.columns])
+            exported += 1
+
+    return exported
+
+# the same report as pilot_destination_frequencies, optionally including the archive. Every worker counts the visits
+# within its shards, which are added up here before the names of the pilots and destinations are looked up
+def parallel_pilot_destination_frequencies(conn: sqlite3.Connection):
+    clear_stdout()
+
+    schemas = report_schemas(conn, binary_decision("Would you like to include archived flights?"))
+
+    started = time.perf_counter()
+    shards = plan_shards(conn, schemas, PARALLEL_WORKERS * SHARDS_PER_WORKER)
+
+    visits: Counter = Counter()
+    for partial in run_sharded(conn, count_destinations, schemas, shards):
+        visits.update(partial)
+
+    pilots = {row[0]: row[1] for row in conn.execute("SELECT id, name FROM pilot").fetchall()}
+    airports = {row[0]: row[1] for row in conn.execute("SELECT id, icao_code FROM airport").fetchall()}
+
+    results: List[dict[str, Value]] = []
+    for (pilot_id, destination_id), count in visits.most_common():
+        # archived assignments may refer to pilots and airports that no longer exist
+        results.append({
+            "pilot": Value.new_text(pilots.get(pilot_id, str(pilot_id))),
+            "destination": Value.new_text(airports.get(destination_id, str(destination_id))),
+            "visits": Value.new_int(count),
+        })
+
+    PILOT_DESTINATION_FREQUENCIES_TABLE.display_records(results)
+    print(f"Computed with {PARALLEL_WORKERS} worker processes in {time.perf_counter() - started:.3f}s")
+
+# exports every flight to a csv file ordered by date. Every worker writes its shards to separate chunk files,
+# which are then joined in shard order
+def parallel_export_flights(conn: sqlite3.Connection):
+    clear_stdout()
+
+    path = input("Please enter the file to export the flights to: ")
+    schemas = report_schemas(conn, binary_decision("Would you like to include archived flights?"))
+
+    started = time.perf_counter()
+    shards = plan_shards(conn, schemas, PARALLEL_WORKERS * SHARDS_PER_WORKER)
+    chunk_paths = [f"{path}.{idx}.part" for idx in range(len(shards))]
+
+    try:
+        counts = run_sharded(conn, export_shard, schemas, shards, [(chunk_path,) for chunk_path in chunk_paths])
+
+        with open(path, "w", newline="") as out:
+            csv.writer(out).writerow([column.name for column in FlightTable().table_def.columns])
+            for chunk_path in chunk_paths:
+                with open(chunk_path, "r", newline="") as chunk:
+                    shutil.copyfileobj(chunk, out)
+    finally:
+        for chunk_path in chunk_paths:
+            if os.path.exists(chunk_path):
+                os.remove(chunk_path)
+
+    print(f"{sum(counts)} flights exported to {path} with {PARALLEL_WORKERS} worker processes in {time.perf_counter() - started:.3f}s")
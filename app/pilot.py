@@ -2,19 +2,24 @@ import sqlite3
 
 # local imports
 from .table import TableDef, ColumnDef, DataType
+from .maintenance import scheduler
+from .transactions import writer
 from .airport import AirportTable
 from .util import binary_decision
 
+# the definition of the pilot table is shared by every handle to it
+PILOT_TABLE_DEF = TableDef("pilot", [
+    ColumnDef("id", DataType.Int),
+    ColumnDef("name", DataType.Text),
+    ColumnDef("logged_hours", DataType.Int),
+    ColumnDef("home_airport_id", DataType.Int)
+])
+
 class PilotTable():
     table_def: TableDef
 
     def __init__(self):
-        self.table_def = TableDef("pilot", [
-            ColumnDef("id", DataType.Int),
-            ColumnDef("name", DataType.Text),
-            ColumnDef("logged_hours", DataType.Int),
-            ColumnDef("home_airport_id", DataType.Int)
-        ])
+        self.table_def = PILOT_TABLE_DEF
     
     def create_record(self, conn: sqlite3.Connection):
         # create a handle to airport table since the user will have to select
@@ -38,8 +43,8 @@ class PilotTable():
                 (?, ?, ?) 
         """
 
-        conn.execute(statement, [value.inner for value in values])
-        conn.commit()
+        writer.execute(conn, statement, [value.inner for value in values])
+        scheduler.record_writes(conn, self.table_def.name)
 
         print("new pilot created successfully")
 
@@ -82,17 +87,14 @@ class PilotTable():
             print(f"    {key}: {value_str}")
         
         if binary_decision("would you like to proceed with these changes?"):
-            update_set = [f"{column.name} = ?" for column in updateable_columns]
             values = [record[column.name].inner for column in updateable_columns]
 
-            if len(update_set) > 0:
-                statement = f"""
-                    UPDATE {self.table_def.name} SET {", ".join(update_set)} WHERE id = ?
-                """
+            if len(updateable_columns) > 0:
+                statement = self.table_def.update_statement([column.name for column in updateable_columns])
 
                 values.append(record["id"].inner)
-                conn.execute(statement, values)
-                conn.commit()
+                writer.execute(conn, statement, values)
+                scheduler.record_writes(conn, self.table_def.name)
 
                 print("existing pilot updated successfully")
     
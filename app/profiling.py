@@ -0,0 +1,121 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import sqlite3
+import tracemalloc
+
+from datetime import datetime
+from typing import Callable, List, Optional
+
+# profiling is enabled by passing --profile to main.py or by setting this environment variable to 1
+PROFILE_ENVIRONMENT_VARIABLE = "AIRLINE_PROFILE"
+PROFILE_FLAG = "--profile"
+
+PROFILE_DIRECTORY = "profiles"
+
+# the number of allocation sites and functions that are shown in the report
+PROFILE_TOP = 15
+
+# the number of frames recorded for every allocation. More frames make tracing slower,
+# but allow the saved snapshots to be grouped by traceback rather than only by line
+TRACE_FRAMES = 10
+
+def profiling_requested() -> bool:
+    return os.environ.get(PROFILE_ENVIRONMENT_VARIABLE, "") not in ["", "0"]
+
+# wraps a console operation with tracemalloc and cProfile. The report shows the peak memory traced during the operation,
+# the lines that allocated the most memory still held at its end and the functions with the most cumulative time.
+# Note that the time of an interactive operation includes the time spent waiting for input
+class OperationProfiler:
+    directory: str
+
+    def __init__(self, directory: str = PROFILE_DIRECTORY):
+        self.directory = directory
+
+    def profile(self, name: str, endpoint: Callable[[sqlite3.Connection], None], conn: sqlite3.Connection):
+        profiler = cProfile.Profile()
+
+        tracemalloc.start(TRACE_FRAMES)
+        profiler.enable()
+        try:
+            endpoint(conn)
+        finally:
+            profiler.disable()
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+            self.report(name, profiler, snapshot, peak)
+
+    def report(self, name: str, profiler: cProfile.Profile, snapshot: tracemalloc.Snapshot, peak: int):
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ])
+
+        print(f"\nProfile of {name}")
+        print(f"    peak traced memory: {format_size(peak)}")
+
+        print(f"\nTop {PROFILE_TOP} allocation sites by memory still held at the end of the operation:")
+        for stat in snapshot.statistics("lineno")[:PROFILE_TOP]:
+            frame = stat.traceback[0]
+            print(f"    {format_size(stat.size):>10} in {stat.count:>8} blocks  {frame.filename}:{frame.lineno}")
+
+        previous = self.latest_snapshot(name)
+        if previous is not None:
+            print(f"\nLargest changes since the previous profile of {name}:")
+            for stat in snapshot.compare_to(tracemalloc.Snapshot.load(previous), "lineno")[:PROFILE_TOP]:
+                frame = stat.traceback[0]
+                print(f"    {format_size(stat.size_diff, signed=True):>10}  {frame.filename}:{frame.lineno}")
+
+        print(f"\nTop {PROFILE_TOP} functions by cumulative time:")
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        print(out.getvalue())
+
+        stats_path, snapshot_path = self.save(name, profiler, snapshot)
+        print(f"Profiles saved to {stats_path} (open with pstats or snakeviz) and {snapshot_path} (load with tracemalloc.Snapshot.load)")
+
+    def save(self, name: str, profiler: cProfile.Profile, snapshot: tracemalloc.Snapshot) -> List[str]:
+        os.makedirs(self.directory, exist_ok=True)
+
+        prefix = os.path.join(self.directory, f"{profile_slug(name)}-{datetime.now().strftime('%Y%m%d%H%M%S%f')}")
+        profiler.dump_stats(f"{prefix}.prof")
+        snapshot.dump(f"{prefix}.tracemalloc")
+
+        return [f"{prefix}.prof", f"{prefix}.tracemalloc"]
+
+    # the snapshot of the most recent profile of the same operation, the timestamps in the file names sort chronologically
+    def latest_snapshot(self, name: str) -> Optional[str]:
+        if not os.path.isdir(self.directory):
+            return None
+
+        slug = profile_slug(name)
+        snapshots = sorted([
+            file_name for file_name in os.listdir(self.directory)
+            if file_name.startswith(f"{slug}-") and file_name.endswith(".tracemalloc")
+        ])
+        if len(snapshots) == 0:
+            return None
+
+        return os.path.join(self.directory, snapshots[-1])
+
+def profile_slug(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+def format_size(size: int, signed: bool = False) -> str:
+    sign = ""
+    if signed:
+        sign = "+" if size >= 0 else "-"
+        size = abs(size)
+
+    for unit in ["B", "KiB", "MiB"]:
+        if size < 1024:
+            return f"{sign}{size:.1f} {unit}" if unit != "B" else f"{sign}{size} {unit}"
+        size /= 1024
+
+    return f"{sign}{size:.1f} GiB"
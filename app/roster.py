@@ -0,0 +1,87 @@
+import sqlite3
+
+from datetime import datetime
+from typing import Any, List
+
+# local imports
+from .table import TableDef, ColumnDef, DataType, Value
+from .flight import FlightTable
+from .pilot import PilotTable
+
+# this produces the upcoming schedule of every pilot, or of the pilots matching the given conditions, in a single query.
+# The window functions look ahead to the next flight of the same pilot to find the time between arriving and departing
+# again, and count the flights of the same pilot on the same day. The results are streamed as they are produced
+def pilot_roster(conn: sqlite3.Connection):
+    flight_table = FlightTable()
+    pilot_table = PilotTable()
+
+    departure_column = flight_table.table_def.column_by_name("departure_time")
+    arrival_column = flight_table.table_def.column_by_name("arrival_time")
+
+    print("Please specify the pilots to include in the roster")
+    pilot_conditions = pilot_table.table_def.get_select_conditions_optional()
+
+    bindings: List[Any] = [departure_column.to_storage(Value.new_datetime(datetime.now()))]
+
+    pilot_filter = ""
+    if len(pilot_conditions) > 0:
+        where_clause = " AND ".join([condition.to_prepared_statement() for condition in pilot_conditions])
+        pilot_filter = f"AND fp.pilot_id IN (SELECT id FROM pilot WHERE {where_clause})"
+        bindings.extend([condition.column.to_storage(condition.value) for condition in pilot_conditions])
+
+    statement = f"""
+        WITH assignments AS (
+            SELECT
+                fp.pilot_id,
+                p.name AS pilot,
+                f.flight_number,
+                f.date,
+                f.departure_time,
+                f.arrival_time,
+                origin.icao_code AS origin,
+                destination.icao_code AS destination,
+                {departure_column.to_epoch_seconds_sql("f.departure_time")} AS departure_epoch,
+                {arrival_column.to_epoch_seconds_sql("f.arrival_time")} AS arrival_epoch
+            FROM
+                flight AS f
+            JOIN
+                flight_pilot AS fp ON f.id = fp.flight_id
+            JOIN
+                pilot AS p ON fp.pilot_id = p.id
+            JOIN
+                airport AS origin ON f.origin_id = origin.id
+            JOIN
+                airport AS destination ON f.destination_id = destination.id
+            WHERE
+                f.departure_time >= ?
+                {pilot_filter}
+        )
+        SELECT
+            pilot,
+            flight_number,
+            departure_time,
+            arrival_time,
+            origin,
+            destination,
+            LEAD(departure_time) OVER pilot_flights AS next_departure,
+            (LEAD(departure_epoch) OVER pilot_flights - arrival_epoch) / 60 AS turnaround_minutes,
+            COUNT(*) OVER (PARTITION BY pilot_id, date) AS flights_that_day
+        FROM assignments
+        WINDOW pilot_flights AS (PARTITION BY pilot_id ORDER BY departure_epoch)
+        ORDER BY pilot, pilot_id, departure_epoch
+    """
+
+    table = TableDef("pilot_roster", [
+        ColumnDef("pilot", DataType.Text),
+        ColumnDef("flight_number", DataType.Text),
+        ColumnDef("departure_time", DataType.DateTime),
+        ColumnDef("arrival_time", DataType.DateTime),
+        ColumnDef("origin", DataType.Text),
+        ColumnDef("destination", DataType.Text),
+        ColumnDef("next_departure", DataType.DateTime, nullable=True),
+        ColumnDef("turnaround_minutes", DataType.Int, nullable=True),
+        ColumnDef("flights_that_day", DataType.Int),
+    ])
+
+    results = table.stream_records(conn.cursor(), statement, bindings)
+    table.display_record_stream(results)
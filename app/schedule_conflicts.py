@@ -0,0 +1,216 @@
+import bisect
+import heapq
+import sqlite3
+
+from typing import Any, Dict, List, Tuple
+
+# local imports
+from .table import TableDef, ColumnDef, DataType, Value
+from .flight import FlightTable
+from .statements import registry, in_list_chunks, in_list_placeholders
+
+# the index on flight_pilot (pilot_id) lets the flights of a pilot be found without scanning every assignment,
+# its primary key only serves lookups by flight_id
+def create_conflict_indexes(conn: sqlite3.Connection):
+    conn.execute("CREATE INDEX IF NOT EXISTS flight_pilot_pilot_id ON flight_pilot (pilot_id)")
+    conn.commit()
+
+# finds the flights assigned to the pilot whose time between departure and arrival overlaps with the given flight.
+# the comparisons are made on the stored values, which sort chronologically in either storage encoding
+def find_conflicts(conn: sqlite3.Connection, flight_id: int, pilot_id: int) -> List[dict[str, Value]]:
+    statement = """
+        SELECT f.*
+        FROM flight_pilot fp
+        JOIN flight f ON fp.flight_id = f.id
+        JOIN flight target ON target.id = ?
+        WHERE
+            fp.pilot_id = ?
+            AND f.id != target.id
+            AND f.departure_time < target.arrival_time
+            AND f.arrival_time > target.departure_time
+        ORDER BY f.departure_time
+    """
+
+    flight_table = FlightTable()
+    return flight_table.table_def.find_records(conn.cursor(), statement, [flight_id, pilot_id])
+
+# this is an in-memory index of the flights a single pilot is assigned to, sorted by departure. The times are epoch
+# seconds, so durations are plain differences. Since no flight assigned to the pilot lasts longer than the longest one seen so far, a search for
+# overlapping flights can stop as soon as it reaches flights that departed that long before the interval starts
+class PilotIntervals:
+    departures: List[int]
+    intervals: List[Tuple[int, int, int]]
+    longest: int
+
+    def __init__(self):
+        self.departures = []
+        self.intervals = []
+        self.longest = 0
+
+    def add(self, departure: int, arrival: int, flight_id: int):
+        idx = bisect.bisect_right(self.departures, departure)
+        self.departures.insert(idx, departure)
+        self.intervals.insert(idx, (departure, arrival, flight_id))
+
+        self.longest = max(self.longest, arrival - departure)
+
+    def overlapping(self, departure: int, arrival: int) -> List[int]:
+        flight_ids: List[int] = []
+
+        # every flight from idx onwards departs at or after the arrival and can not overlap
+        idx = bisect.bisect_left(self.departures, arrival)
+        for existing_departure, existing_arrival, flight_id in reversed(self.intervals[:idx]):
+            if existing_arrival > departure:
+                flight_ids.append(flight_id)
+            elif departure - existing_departure > self.longest:
+                break
+
+        return flight_ids
+
+# an assignment of a batch that was not made, along with the reason why
+class RejectedAssignment:
+    flight_id: int
+    pilot_id: int
+    reason: str
+    # the flights of the pilot that the flight overlaps with, this is empty unless the assignment was rejected for them
+    conflicting_flight_ids: List[int]
+
+    def __init__(self, flight_id: int, pilot_id: int, reason: str, conflicting_flight_ids: List[int] | None = None):
+        self.flight_id = flight_id
+        self.pilot_id = pilot_id
+        self.reason = reason
+        self.conflicting_flight_ids = [] if conflicting_flight_ids is None else conflicting_flight_ids
+
+    def to_str(self) -> str:
+        if len(self.conflicting_flight_ids) == 0:
+            return f"pilot {self.pilot_id} was not assigned to flight {self.flight_id}, {self.reason}"
+
+        conflicting = ", ".join([str(id) for id in self.conflicting_flight_ids])
+        return f"pilot {self.pilot_id} was not assigned to flight {self.flight_id}, {self.reason}: {conflicting}"
+
+# checks a batch of (flight_id, pilot_id) assignments against the existing assignments and against each other.
+# Everything needed is loaded with two queries, after which the checks run against per-pilot interval indexes.
+# Assignments that appear more than once in the batch are only checked and returned once. Returns the assignments that
+# can be made, along with those that can not, which are assignments to unknown flights, assignments that already exist
+# and, unless conflicts are allowed, assignments that overlap with another flight of the same pilot.
+# This should run in the same transaction as the insert of the accepted assignments, so that no other writer can make
+# a conflicting assignment in between
+def check_assignments(conn: sqlite3.Connection, assignments: List[Tuple[int, int]], allow_conflicts: bool = False) -> Tuple[List[Tuple[int, int]], List[RejectedAssignment]]:
+    assignments = list(dict.fromkeys(assignments))
+    if len(assignments) == 0:
+        return [], []
+
+    flight_ids = list(set([flight_id for flight_id, _ in assignments]))
+    pilot_ids = list(set([pilot_id for _, pilot_id in assignments]))
+
+    # the times are selected as epoch seconds in either storage encoding
+    flight_table = FlightTable()
+    departure_column = flight_table.table_def.column_by_name("departure_time")
+    arrival_column = flight_table.table_def.column_by_name("arrival_time")
+    departure_sql = departure_column.to_epoch_seconds_sql("f.departure_time")
+    arrival_sql = arrival_column.to_epoch_seconds_sql("f.arrival_time")
+
+    times: Dict[int, Tuple[int, int]] = {}
+    for chunk in in_list_chunks(flight_ids):
+        def build_times() -> str:
+            return f"SELECT f.id, {departure_sql}, {arrival_sql} FROM flight f WHERE f.id IN ({in_list_placeholders(len(chunk))})"
+
+        statement = registry.get(("flight", "epoch_times_by_id", len(chunk)), build_times)
+        for row in conn.execute(statement, chunk).fetchall():
+            times[row[0]] = (row[1], row[2])
+
+    schedules: Dict[int, PilotIntervals] = {pilot_id: PilotIntervals() for pilot_id in pilot_ids}
+    assigned: set[Tuple[int, int]] = set()
+    for chunk in in_list_chunks(pilot_ids):
+        def build_schedules() -> str:
+            return f"""
+                SELECT fp.pilot_id, f.id, {departure_sql}, {arrival_sql}
+                FROM flight_pilot fp
+                JOIN flight f ON fp.flight_id = f.id
+                WHERE fp.pilot_id IN ({in_list_placeholders(len(chunk))})
+            """
+
+        statement = registry.get(("flight_pilot", "epoch_times_by_pilot_id", len(chunk)), build_schedules)
+
+        for row in conn.execute(statement, chunk).fetchall():
+            schedules[row[0]].add(row[2], row[3], row[1])
+            assigned.add((row[1], row[0]))
+
+    accepted: List[Tuple[int, int]] = []
+    rejected: List[RejectedAssignment] = []
+    for flight_id, pilot_id in assignments:
+        if flight_id not in times:
+            rejected.append(RejectedAssignment(flight_id, pilot_id, "the flight does not exist"))
+            continue
+
+        if (flight_id, pilot_id) in assigned:
+            rejected.append(RejectedAssignment(flight_id, pilot_id, "the pilot is already assigned to it"))
+            continue
+
+        departure, arrival = times[flight_id]
+        conflicting = schedules[pilot_id].overlapping(departure, arrival)
+
+        if len(conflicting) > 0 and not allow_conflicts:
+            rejected.append(RejectedAssignment(flight_id, pilot_id, "it overlaps with other flights of the pilot", conflicting))
+        else:
+            schedules[pilot_id].add(departure, arrival, flight_id)
+            assigned.add((flight_id, pilot_id))
+            accepted.append((flight_id, pilot_id))
+
+    return accepted, rejected
+
+# finds every pair of overlapping assignments across all pilots in a single pass over the assignments
+# ordered by pilot and departure. The flights of the current pilot that have not arrived yet are kept
+# in a heap ordered by arrival, and every flight that departs before one of them has arrived overlaps it
+def schedule_conflict_report(conn: sqlite3.Connection):
+    statement = """
+        SELECT
+            fp.pilot_id,
+            p.name AS pilot,
+            f.id,
+            f.flight_number,
+            f.departure_time,
+            f.arrival_time
+        FROM flight_pilot fp
+        JOIN flight f ON fp.flight_id = f.id
+        JOIN pilot p ON fp.pilot_id = p.id
+        ORDER BY fp.pilot_id, f.departure_time
+    """
+
+    table = TableDef("schedule_conflicts", [
+        ColumnDef("pilot", DataType.Text),
+        ColumnDef("flight_number", DataType.Text),
+        ColumnDef("departure_time", DataType.DateTime),
+        ColumnDef("arrival_time", DataType.DateTime),
+        ColumnDef("conflicting_flight_number", DataType.Text),
+        ColumnDef("conflicting_departure_time", DataType.DateTime),
+        ColumnDef("conflicting_arrival_time", DataType.DateTime),
+    ])
+
+    results: List[dict[str, Value]] = []
+    current_pilot = None
+    in_flight: List[Tuple[Any, int, sqlite3.Row]] = []
+
+    for row in conn.execute(statement):
+        if row["pilot_id"] != current_pilot:
+            current_pilot = row["pilot_id"]
+            in_flight = []
+
+        # flights that arrived before this one departs can not overlap with it or any later flight
+        while len(in_flight) > 0 and in_flight[0][0] <= row["departure_time"]:
+            heapq.heappop(in_flight)
+
+        for _, _, earlier in sorted(in_flight, key=lambda entry: entry[2]["departure_time"]):
+            results.append(table.parse_row({
+                "pilot": row["pilot"],
+                "flight_number": earlier["flight_number"],
+                "departure_time": earlier["departure_time"],
+                "arrival_time": earlier["arrival_time"],
+                "conflicting_flight_number": row["flight_number"],
+                "conflicting_departure_time": row["departure_time"],
+                "conflicting_arrival_time": row["arrival_time"],
+            }))
+
+        heapq.heappush(in_flight, (row["arrival_time"], row["id"], row))
+
+    table.display_records(results)
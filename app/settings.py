@@ -0,0 +1,31 @@
+import sqlite3
+
+from typing import Optional
+
+# this is a small key/value table that is used to persist settings that describe the database itself,
+# such as the storage encoding used by a particular table, so that every session interprets the data the same way
+def create_settings_table(conn: sqlite3.Connection):
+    statement = """
+        CREATE TABLE IF NOT EXISTS setting (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    """
+
+    conn.execute(statement)
+    conn.commit()
+
+def get_setting(conn: sqlite3.Connection, key: str) -> Optional[str]:
+    row = conn.execute("SELECT value FROM setting WHERE key = ?", [key]).fetchone()
+    if row is None:
+        return None
+    return row[0]
+
+# note that this does not commit, so that the setting can be changed in the same transaction as the data it describes
+def set_setting(conn: sqlite3.Connection, key: str, value: str):
+    statement = """
+        INSERT INTO setting (key, value) VALUES (?, ?)
+        ON CONFLICT (key) DO UPDATE SET value = excluded.value
+    """
+
+    conn.execute(statement, [key, value])
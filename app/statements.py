@@ -0,0 +1,91 @@
+import sqlite3
+import threading
+
+from typing import Callable, Dict, Hashable, List, Tuple, TypeVar
+
+# local imports
+from .util import clear_stdout
+
+# the most statement shapes the registry keeps. Shapes built once it is full are still returned but not kept
+STATEMENT_REGISTRY_CAPACITY = 256
+
+T = TypeVar("T")
+
+# the most values bound to a single IN (...) list. Longer lists are split into chunks of this size
+IN_LIST_CHUNK_SIZE = 512
+
+# the prepared statement cache of every connection fits all statements of the registry, on top of the
+# statements that are not built through the registry, which are given the default size of the cache
+STATEMENT_CACHE_SIZE = STATEMENT_REGISTRY_CAPACITY + 128
+
+# keeps the sql of every statement shape, such as a select on a table with a particular set of conditions, so that it
+# is only built once. Since the same shape always yields the identical string, sqlite3 also finds it in the prepared
+# statement cache of the connection and skips preparing it again
+class StatementRegistry:
+    statements: Dict[Tuple[Hashable, ...], str]
+    capacity: int
+    hits: int
+    misses: int
+    # the registry is shared by the worker threads of the http service
+    lock: threading.Lock
+
+    def __init__(self, capacity: int = STATEMENT_REGISTRY_CAPACITY):
+        self.statements = {}
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    # returns the statement registered under the key, building and registering it with build if there is none yet
+    def get(self, key: Tuple[Hashable, ...], build: Callable[[], str]) -> str:
+        with self.lock:
+            statement = self.statements.get(key)
+            if statement is not None:
+                self.hits += 1
+                return statement
+
+            self.misses += 1
+
+        statement = build()
+
+        with self.lock:
+            if len(self.statements) < self.capacity:
+                self.statements.setdefault(key, statement)
+
+        return statement
+
+    def show_stats(self, conn: sqlite3.Connection):
+        clear_stdout()
+
+        with self.lock:
+            lookups = self.hits + self.misses
+            hit_rate = self.hits / lookups * 100 if lookups > 0 else 0.0
+
+            print(f"Registered statement shapes: {len(self.statements)} of {self.capacity}")
+            print(f"Lookups: {lookups} ({self.hits} hits, {self.misses} misses, {hit_rate:.1f}% hit rate)")
+            print(f"Prepared statement cache size per connection: {STATEMENT_CACHE_SIZE}")
+
+# splits values into chunks for IN (...) lists. Every chunk is padded up to the next power of two by repeating its last
+# value, which does not change which rows match. Lists of any length then share one of a handful of statement shapes,
+# rather than building and preparing a new statement for every length
+def in_list_chunks(values: List[T], chunk_size: int = IN_LIST_CHUNK_SIZE) -> List[List[T]]:
+    chunks: List[List[T]] = []
+
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start:start + chunk_size]
+
+        padded_length = 1
+        while padded_length < len(chunk):
+            padded_length *= 2
+
+        chunks.append(chunk + [chunk[-1]] * (padded_length - len(chunk)))
+
+    return chunks
+
+# the placeholders of an IN (...) list of the given length, where every value binds the given number of variables
+def in_list_placeholders(length: int, width: int = 1) -> str:
+    placeholder = "?" if width == 1 else f"({', '.join(['?' for _ in range(width)])})"
+    return ", ".join([placeholder for _ in range(length)])
+
+# this is the registry shared by all table definitions
+registry = StatementRegistry()
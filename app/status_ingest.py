@@ -0,0 +1,236 @@
+import json
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+from typing import Any, Dict, Iterable, List, Optional, TextIO, Tuple
+
+# local imports
+from .table import TableDef, DataType, Value
+from .flight import FlightTable
+from .maintenance import scheduler
+from .transactions import writer
+from .statements import registry, in_list_chunks, in_list_placeholders
+from .util import clear_stdout
+
+# events for the same flight that arrive within this many seconds of each other are coalesced into a single update
+INGEST_WINDOW = 0.5
+
+# the maximum number of distinct flights updated per transaction, a batch is applied early once it is reached
+INGEST_MAX_BATCH = 5000
+
+# the columns of a flight that a status event may update
+EVENT_COLUMNS = ["status", "departure_time", "arrival_time"]
+
+class IngestStats:
+    received: int
+    invalid: int
+    batches: int
+    updated: int
+    unknown: int
+
+    def __init__(self):
+        self.received = 0
+        self.invalid = 0
+        self.batches = 0
+        self.updated = 0
+        self.unknown = 0
+
+    def to_str(self) -> str:
+        return f"{self.received} events received, {self.invalid} invalid, {self.updated} flights updated in {self.batches} batches, {self.unknown} updates for unknown flights"
+
+# this parses status events and coalesces them per flight until they are applied to the database in batches.
+# Each event is a json object holding the flight_number and date that identify the flight, along with a status
+# and/or the actual departure_time and arrival_time. Later events for the same flight override earlier ones
+class StatusIngestor:
+    table_def: TableDef
+    # the pending updates per flight number and date. The values are only encoded for storage once they are applied,
+    # inside the transaction, since the storage encoding may be changed by another connection in the meantime
+    pending: Dict[Tuple[str, Any], Dict[str, Value]]
+    stats: IngestStats
+    date_cache: Dict[str, Any]
+
+    def __init__(self):
+        self.table_def = FlightTable().table_def
+        self.pending = {}
+        self.stats = IngestStats()
+        # events for the same day share the same date, so each date string only has to be parsed once
+        self.date_cache = {}
+
+    # validates an event and adds it to the pending batch. Returns False if the event was rejected
+    def add_event(self, line: str) -> bool:
+        self.stats.received += 1
+
+        try:
+            event = json.loads(line)
+            key = (str(event["flight_number"]), self.parse_date(event["date"]))
+
+            updates: Dict[str, Any] = {}
+            for column_name in EVENT_COLUMNS:
+                if column_name not in event:
+                    continue
+
+                column = self.table_def.column_by_name(column_name)
+                value = column.parse_value(event[column_name])
+                if not column.is_allowed(value):
+                    raise ValueError(f"{value.to_str()} is not an allowed value for column with name: {column_name}")
+
+                updates[column_name] = value
+
+            if len(updates) == 0:
+                raise ValueError("event does not update any column")
+        except (ValueError, KeyError, TypeError):
+            self.stats.invalid += 1
+            return False
+
+        self.pending.setdefault(key, {}).update(updates)
+        return True
+
+    def parse_date(self, raw: Any) -> Any:
+        if not isinstance(raw, str):
+            raise ValueError("date must be a string")
+
+        if raw not in self.date_cache:
+            column = self.table_def.column_by_name("date")
+            self.date_cache[raw] = column.parse_value(raw).inner
+
+        return self.date_cache[raw]
+
+    # applies all pending updates in a single transaction. Updates are grouped by the set of columns they change,
+    # so that every group can be applied with one executemany of the same prepared statement
+    def flush(self, conn: sqlite3.Connection):
+        if len(self.pending) == 0:
+            return
+
+        groups: Dict[Tuple[str, ...], List[Tuple[str, Any]]] = {}
+        for key, updates in self.pending.items():
+            column_names = tuple([name for name in EVENT_COLUMNS if name in updates])
+            groups.setdefault(column_names, []).append(key)
+
+        def apply(conn: sqlite3.Connection) -> int:
+            updated = 0
+            for column_names, keys in groups.items():
+                columns = [self.table_def.column_by_name(name) for name in column_names]
+                rows = [
+                    [column.to_storage(self.pending[key][column.name]) for column in columns] + list(self.storage_key(key))
+                    for key in keys
+                ]
+
+                updated += conn.executemany(self.update_statement(column_names), rows).rowcount
+            return updated
+
+        updated = writer.run(conn, apply)
+
+        scheduler.record_writes(conn, self.table_def.name, updated)
+
+        # only changes to the departure and arrival times are of interest to the write listeners
+        if len(FlightTable.write_listeners) > 0:
+            retimed = [key for key, updates in self.pending.items() if "departure_time" in updates or "arrival_time" in updates]
+            if len(retimed) > 0:
+                FlightTable.notify_written(conn, self.find_flight_ids(conn, retimed))
+
+        self.stats.batches += 1
+        self.stats.updated += updated
+        self.stats.unknown += len(self.pending) - updated
+        self.pending.clear()
+
+    # the update of the given columns of a flight identified by its flight_number and date, in the same order
+    def update_statement(self, column_names: Tuple[str, ...]) -> str:
+        def build() -> str:
+            update_set = ", ".join([f"{name} = ?" for name in column_names])
+            return f"""
+                UPDATE {self.table_def.name} SET {update_set} WHERE flight_number = ? AND date = ?
+            """
+
+        return registry.get((self.table_def.name, "update_by_flight_number_and_date", column_names), build)
+
+    def find_flight_ids(self, conn: sqlite3.Connection, keys: List[Tuple[str, Any]]) -> List[int]:
+        flight_ids: List[int] = []
+
+        for chunk in in_list_chunks(keys):
+            def build() -> str:
+                return f"SELECT id FROM {self.table_def.name} WHERE (flight_number, date) IN (VALUES {in_list_placeholders(len(chunk), 2)})"
+
+            statement = registry.get((self.table_def.name, "find_by_flight_number_and_date", len(chunk)), build)
+
+            bindings = [binding for key in chunk for binding in self.storage_key(key)]
+            flight_ids.extend([row[0] for row in conn.execute(statement, bindings).fetchall()])
+
+        return flight_ids
+
+    # the flight number and date of a pending update, as they are bound to find the flight
+    def storage_key(self, key: Tuple[str, Any]) -> Tuple[str, Any]:
+        flight_number, date = key
+        return (flight_number, self.table_def.column_by_name("date").to_storage(Value(DataType.Date, date)))
+
+    # reads events until the stream ends. The stream is read on a separate thread so that a batch is still applied
+    # once its window has elapsed, even when the stream goes quiet and no further events arrive
+    def ingest(self, conn: sqlite3.Connection, stream: TextIO, window: float = INGEST_WINDOW, max_batch: int = INGEST_MAX_BATCH) -> IngestStats:
+        lines: queue.Queue[Optional[str]] = queue.Queue(maxsize=max_batch)
+        reader = threading.Thread(target=read_stream, args=(stream, lines), daemon=True)
+        reader.start()
+
+        window_started: Optional[float] = None
+        stream_ended = False
+        while not stream_ended:
+            timeout = None
+            if window_started is not None:
+                timeout = max(window_started + window - time.monotonic(), 0)
+
+            try:
+                line = lines.get(timeout=timeout)
+            except queue.Empty:
+                line = ""
+
+            # take whatever else is already waiting on the queue without blocking
+            while line is not None:
+                if line.strip() != "" and self.add_event(line) and window_started is None:
+                    window_started = time.monotonic()
+
+                if len(self.pending) >= max_batch:
+                    break
+
+                try:
+                    line = lines.get_nowait()
+                except queue.Empty:
+                    break
+
+            stream_ended = line is None
+
+            if window_started is not None and (time.monotonic() - window_started >= window or len(self.pending) >= max_batch):
+                self.flush(conn)
+                window_started = None
+
+        self.flush(conn)
+        return self.stats
+
+# puts every line of the stream on the queue, followed by None once the stream has ended
+def read_stream(stream: Iterable[str], lines: "queue.Queue[Optional[str]]"):
+    for line in stream:
+        lines.put(line)
+    lines.put(None)
+
+def ingest_status_events(conn: sqlite3.Connection, stream: TextIO) -> IngestStats:
+    ingestor = StatusIngestor()
+    return ingestor.ingest(conn, stream)
+
+def ingest_status_events_from_file(conn: sqlite3.Connection):
+    clear_stdout()
+
+    path = input("Please enter the file to read flight status events from: ")
+
+    try:
+        with open(path, "r") as stream:
+            stats = ingest_status_events(conn, stream)
+    except OSError:
+        print(f"The file {path} could not be read")
+        return
+
+    print(stats.to_str())
+
+# this is the entrypoint used when events are piped into the program, it reads until stdin is closed
+def ingest_status_events_from_stdin(conn: sqlite3.Connection):
+    stats = ingest_status_events(conn, sys.stdin)
+    print(stats.to_str(), file=sys.stderr)
@@ -1,11 +1,19 @@
 import sqlite3
 
-from typing import List, Any, Callable, Optional
+from typing import List, Any, Callable, Optional, Iterable, Iterator
 from enum import Enum
-from datetime import datetime
+from datetime import datetime, timedelta
+
+# numpy is optional, it is only needed for columnar results
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # local imports
 from .util import select_int_in_range, select_int_in_range_with_abort, clear_stdout, binary_decision
+from .transactions import writer
+from .statements import registry
 
 class DataType(Enum):
     Int = 1
@@ -13,6 +21,16 @@ class DataType(Enum):
     Date = 3
     DateTime = 4
 
+# this describes how a column is physically stored on the database. Text is the default and stores
+# dates and datetimes as formatted strings. Epoch stores dates as integer days since the unix epoch
+# and datetimes as integer seconds since the unix epoch, which makes for smaller rows and cheaper range scans
+class StorageEncoding(Enum):
+    Text = 1
+    Epoch = 2
+
+UNIX_EPOCH = datetime(1970, 1, 1)
+SECONDS_PER_DAY = 86400
+
 class Value:
     type: DataType
     inner: Any
@@ -57,12 +75,64 @@ class ColumnDef:
     type: DataType
     nullable: bool
     allowed_values: Optional[List[Value]]
+    encoding: StorageEncoding
 
-    def __init__(self, name: str, type: DataType, nullable=False, allowed_values: Optional[List[Value]] = None):
+    def __init__(self, name: str, type: DataType, nullable=False, allowed_values: Optional[List[Value]] = None, encoding: StorageEncoding = StorageEncoding.Text):
         self.name = name
         self.type = type
         self.nullable = nullable
         self.allowed_values = allowed_values
+        self.encoding = encoding
+
+    def is_allowed(self, value: Value) -> bool:
+        if self.allowed_values is None:
+            return True
+        return value.inner in [allowed_value.inner for allowed_value in self.allowed_values]
+
+    # converts a value into the representation that is stored on the database for this column.
+    # the result of this method is what should be bound to a prepared statement
+    def to_storage(self, value: Value) -> Any:
+        if value.inner is None or self.encoding == StorageEncoding.Text:
+            return value.inner
+
+        match self.type:
+            case DataType.Date:
+                return (value.inner - UNIX_EPOCH).days
+            case DataType.DateTime:
+                return int((value.inner - UNIX_EPOCH).total_seconds())
+            case _:
+                return value.inner
+
+    # generates an sql expression that converts the stored value of this column to seconds since the unix epoch.
+    # this checks the type of the stored value rather than the encoding of the column, so that the expression
+    # stays correct for rows written in either encoding
+    def to_epoch_seconds_sql(self, expr: str) -> str:
+        match self.type:
+            case DataType.Date:
+                return f"(CASE typeof({expr}) WHEN 'integer' THEN {expr} * {SECONDS_PER_DAY} ELSE CAST(strftime('%s', {expr}) AS INTEGER) END)"
+            case DataType.DateTime:
+                return f"(CASE typeof({expr}) WHEN 'integer' THEN {expr} ELSE CAST(strftime('%s', {expr}) AS INTEGER) END)"
+            case _:
+                raise ValueError(f"column with name: {self.name} does not hold a date or datetime")
+
+    # converts a batch of stored values of this column into a typed array. Integers become int64, or float64 with NaN
+    # for NULL when the column is nullable. Dates and datetimes become datetime64 from either storage encoding. Columns
+    # with allowed values become categorical codes, which index into allowed_values and are -1 for anything else
+    def to_array(self, vals: List[Any]) -> Any:
+        match self.type:
+            case DataType.Int if self.nullable:
+                return np.array(vals, dtype=np.float64)
+            case DataType.Int:
+                return np.array(vals, dtype=np.int64)
+            case DataType.Date:
+                return np.array(vals, dtype="datetime64[D]")
+            case DataType.DateTime:
+                return np.array(vals, dtype="datetime64[s]")
+            case DataType.Text if self.allowed_values is not None:
+                codes = {allowed_value.inner: idx for idx, allowed_value in enumerate(self.allowed_values)}
+                return np.array([codes.get(val, -1) for val in vals], dtype=np.int16)
+            case DataType.Text:
+                return np.array(vals, dtype=object)
 
     def parse_value(self, val: Any) -> Value:
         inner: Any = None
@@ -84,6 +154,12 @@ class ColumnDef:
                     inner = str(val)
                 except ValueError:
                     raise ValueError(f"parsing string failed for column with name: {self.name}")
+            case DataType.Date if isinstance(val, int):
+                # dates stored with the epoch encoding are integer days since the unix epoch
+                inner = UNIX_EPOCH + timedelta(days=val)
+            case DataType.DateTime if isinstance(val, int):
+                # datetimes stored with the epoch encoding are integer seconds since the unix epoch
+                inner = UNIX_EPOCH + timedelta(seconds=val)
             case DataType.Date:
                 for date_format in ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d"]:
                     try:
@@ -152,6 +228,12 @@ class TableDef:
         self.name = name
         self.columns = columns
 
+    def column_by_name(self, name: str) -> ColumnDef:
+        for column in self.columns:
+            if column.name == name:
+                return column
+        raise ValueError(f"table {self.name} does not contain a column by the following name: {name}")
+
     def parse_rows(self, rows: List[sqlite3.Row]) -> List[dict[str, Value]]:
         return [self.parse_row(row) for row in rows]
 
@@ -220,12 +302,11 @@ class TableDef:
             try:
                 val = column.parse_value(raw_input)
 
-                if column.allowed_values is not None:
-                    if val.inner not in [allowed_value.inner for allowed_value in column.allowed_values]:
-                        print(f"Invalid input. You may only enter one of the following allowed values:")
-                        for allowed_value in column.allowed_values:
-                            print(f"    {allowed_value.to_str()}")
-                        continue
+                if not column.is_allowed(val):
+                    print(f"Invalid input. You may only enter one of the following allowed values:")
+                    for allowed_value in column.allowed_values:
+                        print(f"    {allowed_value.to_str()}")
+                    continue
 
                 return val
             except ValueError:
@@ -285,22 +366,87 @@ class TableDef:
         user_supplied_conditions = self.get_select_conditions_optional()
         conditions.extend(user_supplied_conditions)
 
-        prepared_conditions = [condition.to_prepared_statement() for condition in conditions]
-        condition_values = [condition.value.inner for condition in conditions]
-
-        statement = f"""
-            SELECT * FROM {self.name}
-        """
-
-        if len(prepared_conditions) > 0:
-            where_clause = " AND ".join(prepared_conditions)
-            statement = f"{statement} WHERE {where_clause}"
+        statement, condition_values = self.select_statement(conditions)
 
         # results = cursor.execute(statement, condition_values).fetchall()
 
         # return self.parse_rows(results)
         return self.find_records(cursor, statement, condition_values)
 
+    # builds a prepared statement that selects the records matching all of the given conditions, along with its bindings.
+    # The statement only depends on the columns and operators of the conditions, so it is built once per combination of them
+    def select_statement(self, conditions: List[SelectCondition]) -> tuple[str, List[Any]]:
+        signature = tuple([(condition.column.name, condition.operator.name) for condition in conditions])
+        condition_values = [condition.column.to_storage(condition.value) for condition in conditions]
+
+        def build() -> str:
+            prepared_conditions = [condition.to_prepared_statement() for condition in conditions]
+
+            statement = f"""
+                SELECT * FROM {self.name}
+            """
+
+            if len(prepared_conditions) > 0:
+                where_clause = " AND ".join(prepared_conditions)
+                statement = f"{statement} WHERE {where_clause}"
+
+            return statement
+
+        return registry.get((self.name, "select", signature), build), condition_values
+
+    # builds a prepared statement that inserts a record with values for the given columns, in the same order
+    def insert_statement(self, column_names: List[str]) -> str:
+        def build() -> str:
+            return f"""
+                INSERT INTO {self.name}
+                    ({", ".join(column_names)})
+                VALUES
+                    ({", ".join(["?" for _ in column_names])})
+            """
+
+        return registry.get((self.name, "insert", tuple(column_names)), build)
+
+    # builds a prepared statement that updates the given columns of a record, in the same order, followed by its id
+    def update_statement(self, column_names: List[str]) -> str:
+        def build() -> str:
+            update_set = [f"{column_name} = ?" for column_name in column_names]
+
+            return f"""
+                UPDATE {self.name} SET {", ".join(update_set)} WHERE id = ?
+            """
+
+        return registry.get((self.name, "update", tuple(column_names)), build)
+
+    # inserts a record from the given values, which are keyed by column name. Returns the id of the new row
+    def insert_values(self, conn: sqlite3.Connection, values: dict[str, Value]) -> int:
+        columns = [self.column_by_name(name) for name in values.keys()]
+
+        statement = self.insert_statement([column.name for column in columns])
+
+        # the values are encoded inside the transaction, as the storage encoding of a column may be changed by another
+        # connection until the write lock is held
+        def insert(conn: sqlite3.Connection) -> sqlite3.Cursor:
+            return conn.execute(statement, [column.to_storage(values[column.name]) for column in columns])
+
+        cursor = writer.run(conn, insert)
+
+        return cursor.lastrowid
+
+    # updates the given columns of the record with the given id. Returns the number of updated rows
+    def update_values(self, conn: sqlite3.Connection, id: int, values: dict[str, Value]) -> int:
+        columns = [self.column_by_name(name) for name in values.keys()]
+
+        statement = self.update_statement([column.name for column in columns])
+
+        def update(conn: sqlite3.Connection) -> sqlite3.Cursor:
+            bindings = [column.to_storage(values[column.name]) for column in columns]
+            bindings.append(id)
+            return conn.execute(statement, bindings)
+
+        cursor = writer.run(conn, update)
+
+        return cursor.rowcount
+
     # this is a more generic method that expects a prepared statement to be supplied as an argument explicitly.
     # The shape of the results returned by the statement must exactly map onto the columns defined here
     def find_records(self, cursor: sqlite3.Cursor, statement, variable_bindings: List[Any] | None = None) -> List[dict[str, Value]]:
@@ -309,6 +455,53 @@ class TableDef:
         
         results = cursor.execute(statement, variable_bindings).fetchall()
         return self.parse_rows(results)
+
+    # this is a columnar counterpart to find_records for analytical queries. Instead of a dict of values per row,
+    # it returns one typed array per column, filled in batches straight from the cursor without creating any values
+    def find_columns(self, cursor: sqlite3.Cursor, statement, variable_bindings: List[Any] | None = None, batch_size: int = 10000) -> dict[str, Any]:
+        if np is None:
+            raise ImportError("numpy is required for columnar results")
+
+        if variable_bindings is None:
+            variable_bindings = []
+
+        cursor.execute(statement, variable_bindings)
+
+        names = [description[0] for description in cursor.description]
+        positions: List[int] = []
+        for col_def in self.columns:
+            if col_def.name not in names:
+                raise ValueError(f"returned row does not contain a column by the following name: {col_def.name}")
+            positions.append(names.index(col_def.name))
+
+        batches: dict[str, List[Any]] = {col_def.name: [] for col_def in self.columns}
+        while True:
+            results = cursor.fetchmany(batch_size)
+            if len(results) == 0:
+                break
+
+            columns = list(zip(*results))
+            for col_def, position in zip(self.columns, positions):
+                batches[col_def.name].append(col_def.to_array(list(columns[position])))
+
+        return {
+            col_def.name: np.concatenate(batches[col_def.name]) if len(batches[col_def.name]) > 0 else col_def.to_array([])
+            for col_def in self.columns
+        }
+
+    # this is a streaming counterpart to find_records, the results are fetched and parsed in batches
+    # as they are consumed so that large results never have to be held in memory all at once
+    def stream_records(self, cursor: sqlite3.Cursor, statement, variable_bindings: List[Any] | None = None, batch_size: int = 1000) -> Iterator[dict[str, Value]]:
+        if variable_bindings is None:
+            variable_bindings = []
+
+        cursor.execute(statement, variable_bindings)
+        while True:
+            results = cursor.fetchmany(batch_size)
+            if len(results) == 0:
+                return
+
+            yield from self.parse_rows(results)
         
 
     def select_record(self, cursor: sqlite3.Cursor, conditions: List[SelectCondition] | None = None) -> Optional[dict[str, Value]]:
@@ -331,4 +524,18 @@ class TableDef:
         for idx, record in enumerate(records):
             values = [record[key].to_str() for key in record.keys()]
             display_row = ",    ".join(values)
-            print(f"    ({idx + 1}). {display_row}")
\ No newline at end of file
+            print(f"    ({idx + 1}). {display_row}")
+
+    # displays records as they are produced, which means the number of records is only known at the end
+    def display_record_stream(self, records: Iterable[dict[str, Value]]):
+        header = ",    ".join([column.name for column in self.columns])
+        print(f"        {header}")
+
+        count = 0
+        for record in records:
+            count += 1
+            values = [record[key].to_str() for key in record.keys()]
+            display_row = ",    ".join(values)
+            print(f"    ({count}). {display_row}")
+
+        print(f"Your query yielded {count} records")
@@ -0,0 +1,150 @@
+import random
+import sqlite3
+import threading
+import time
+
+from typing import Any, Callable, List, TypeVar
+
+# local imports
+from .util import clear_stdout
+
+T = TypeVar("T")
+
+# the number of times a write that lost the race for the database lock is attempted before giving up
+MAX_WRITE_ATTEMPTS = 8
+
+# the backoff before the n-th retry is drawn uniformly between 0 and min(cap, base * 2^n) seconds. The jitter
+# keeps writers that failed at the same moment from retrying in lockstep and colliding again
+BACKOFF_BASE = 0.05
+BACKOFF_CAP = 2.0
+
+# the contention encountered by the writes of this process so far
+class WriteStats:
+    # the number of write transactions that were committed
+    committed: int
+    # the number of write transactions that still failed after the last attempt
+    failed: int
+    # the number of times a write transaction was attempted again
+    retries: int
+    # the number of committed write transactions that needed more than one attempt
+    contended: int
+    # the total seconds spent acquiring the write lock, this includes the time sqlite waited for the busy timeout
+    lock_wait: float
+    # the total seconds spent sleeping between attempts
+    backoff_wait: float
+
+    def __init__(self):
+        self.committed = 0
+        self.failed = 0
+        self.retries = 0
+        self.contended = 0
+        self.lock_wait = 0.0
+        self.backoff_wait = 0.0
+
+# runs write transactions against the database. Every transaction starts with BEGIN IMMEDIATE, which takes the write lock
+# up front rather than at the first write. A deferred transaction that reads before it writes can otherwise deadlock
+# with another such transaction, as neither can upgrade its read lock while the other holds one. When the lock can not be
+# acquired within the busy timeout of the connection, the whole transaction is rolled back and run again after a backoff
+class WriteExecutor:
+    stats: WriteStats
+    # the statistics are updated from several threads, such as by the workers of the http service
+    lock: threading.Lock
+    # callbacks that are run at the start of every write transaction, once the write lock is held. Anything read by
+    # them can not be changed by another connection until the transaction ends
+    begin_listeners: List[Callable[[sqlite3.Connection], None]]
+
+    def __init__(self):
+        self.stats = WriteStats()
+        self.lock = threading.Lock()
+        self.begin_listeners = []
+
+    # runs work inside a write transaction and returns its result once committed. work may be run more than once,
+    # so any side effects outside the database should only happen after this returns
+    def run(self, conn: sqlite3.Connection, work: Callable[[sqlite3.Connection], T]) -> T:
+        # a transaction that is already open belongs to the caller, who is responsible for committing it
+        if conn.in_transaction:
+            return work(conn)
+
+        attempt = 0
+        while True:
+            attempt += 1
+
+            try:
+                started = time.perf_counter()
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                finally:
+                    self.add_lock_wait(time.perf_counter() - started)
+
+                for listener in self.begin_listeners:
+                    listener(conn)
+
+                result = work(conn)
+                conn.commit()
+            except sqlite3.OperationalError as e:
+                if conn.in_transaction:
+                    conn.rollback()
+
+                if not is_lock_error(e):
+                    raise e
+
+                if attempt >= MAX_WRITE_ATTEMPTS:
+                    with self.lock:
+                        self.stats.failed += 1
+                    raise e
+
+                backoff = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                with self.lock:
+                    self.stats.retries += 1
+                    self.stats.backoff_wait += backoff
+
+                time.sleep(backoff)
+                continue
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise e
+
+            with self.lock:
+                self.stats.committed += 1
+                if attempt > 1:
+                    self.stats.contended += 1
+
+            return result
+
+    def execute(self, conn: sqlite3.Connection, statement: str, bindings: List[Any] | None = None) -> sqlite3.Cursor:
+        if bindings is None:
+            bindings = []
+
+        return self.run(conn, lambda conn: conn.execute(statement, bindings))
+
+    def executemany(self, conn: sqlite3.Connection, statement: str, rows: List[Any]) -> sqlite3.Cursor:
+        return self.run(conn, lambda conn: conn.executemany(statement, rows))
+
+    def add_lock_wait(self, elapsed: float):
+        with self.lock:
+            self.stats.lock_wait += elapsed
+
+    def show_stats(self, conn: sqlite3.Connection):
+        clear_stdout()
+
+        with self.lock:
+            stats = self.stats
+            print(f"Committed write transactions: {stats.committed}")
+            print(f"Write transactions that had to be retried: {stats.contended}")
+            print(f"Write transactions that failed after {MAX_WRITE_ATTEMPTS} attempts: {stats.failed}")
+            print(f"Retries: {stats.retries}")
+            print(f"Time spent waiting for the write lock: {stats.lock_wait:.3f}s")
+            print(f"Time spent backing off between attempts: {stats.backoff_wait:.3f}s")
+
+# another connection holding the lock is reported as SQLITE_BUSY, or as SQLITE_LOCKED for a conflict within this
+# process. The extended result codes, such as SQLITE_BUSY_SNAPSHOT, keep the primary code in their lowest byte
+def is_lock_error(e: sqlite3.OperationalError) -> bool:
+    code = getattr(e, "sqlite_errorcode", None)
+    if code is None:
+        return "locked" in str(e) or "busy" in str(e)
+
+    return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+# this is the executor shared by all table write paths
+writer = WriteExecutor()
@@ -1,8 +1,34 @@
+import sys
+
 from app.console import Console
+from app.status_ingest import ingest_status_events_from_stdin
+from app.http_service import serve_http
+from app.profiling import PROFILE_FLAG
+
+# commands that can be given as the first argument to run the program non-interactively
+COMMANDS = {
+    "ingest-status": ingest_status_events_from_stdin,
+    "serve": serve_http,
+}
 
 def main():
+    args = sys.argv[1:]
+
+    # profiling can be enabled for any command as well as for the interactive console
+    profile = PROFILE_FLAG in args
+    args = [arg for arg in args if arg != PROFILE_FLAG]
+
+    if len(args) > 0:
+        command = COMMANDS.get(args[0])
+        if command is None:
+            print(f"Unknown command: {args[0]}. Available commands are: {', '.join(COMMANDS.keys())}")
+            sys.exit(1)
+
+        Console(profile).run_command(command)
+        return
+
     print("Welcome to my_package!")
-    Console().run()
+    Console(profile).run()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()